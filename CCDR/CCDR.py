@@ -17,8 +17,18 @@ PI_PIN_EM_ENABLE    =  9 # Header pin 21(21) # OUTPUT
 PI_PIN_WTC_COMM_IRQ = 25 # Header pin 22(22) # INPUT
 PI_PIN_PLP_COMM_IRQ =  8 # Header pin 24(24) # INPUT
 
+# Pins driven high to enable and low to disable every subsystem, enable pin first
+# PLP reset is active low and is held low while the board is unpowered
+SUBSYSTEM_PINS = {
+	"electrometer": [PI_PIN_EM_ENABLE],
+	"plp":          [PI_PIN_PLP_ENABLE, PI_PIN_PLP_RESET],
+	"picoscope":    [PI_PIN_PICO_ENABLE]
+}
+
 class CCDR:
-	def __init__(self, pi):
+	# Outputs are left as they are if reset_outputs is False, so a process attaching to
+	# already running subsystems does not switch them off
+	def __init__(self, pi, reset_outputs = True):
 
 		# Store pigpio instance
 		self.pi = pi
@@ -34,6 +44,7 @@ class CCDR:
 		self.pi.set_mode(PI_PIN_EM_ENABLE,   pigpio.OUTPUT)
 
 		# Set default states for outputs
+		if not reset_outputs: return
 		self.pi.write(PI_PIN_PICO_ENABLE, 0)
 		self.pi.write(PI_PIN_HEARTBEAT,   1)
 		self.pi.write(PI_PIN_PLP_RESET,   1)
@@ -46,6 +57,14 @@ class CCDR:
 		else:      value = 0
 		self.pi.write(gpio, value)
 
+	# Dictionary mapping gpio pins to booleans sets enable states of several pins at once
+	# All pins being enabled change in one bank write and all pins being disabled in another
+	def generic_enable_many(self, states):
+		enable = sum(1 << gpio for gpio, state in states.items() if state)
+		disable = sum(1 << gpio for gpio, state in states.items() if not state)
+		if enable: self.pi.set_bank_1(enable)
+		if disable: self.pi.clear_bank_1(disable)
+
 	# Boolean sets enable state of Picoscope
 	def enable_picoscope(self, enable):
 		self.generic_enable(PI_PIN_PICO_ENABLE, enable)
@@ -0,0 +1,65 @@
+import sys
+import json
+import time
+import socket
+
+# Socket of CCDRSupervisor.py
+SOCKET_PATH = '/tmp/ccdr.sock'
+
+# Seconds to wait for a response; acquisition windows extend this by their own length
+TIMEOUT = 5.0
+
+# Send requests to supervisor in one round trip
+# Return list of responses in request order
+def request(requests, path = SOCKET_PATH, timeout = TIMEOUT):
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		sock.settimeout(timeout + sum(float(r.get("seconds", 0)) for r in requests))
+		sock.connect(path)
+		sock.sendall(b''.join(json.dumps(r).encode() + b'\n' for r in requests))
+		with sock.makefile('rb') as f:
+			responses = []
+			for r in requests:
+				line = f.readline()
+				if not line: raise ConnectionError("supervisor closed connection")
+				responses.append(json.loads(line))
+	return responses
+
+# Send single command with keyword arguments, returning response
+def command(cmd, path = SOCKET_PATH, **args):
+	args["cmd"] = cmd
+	return request([args], path)[0]
+
+# Convert command line value to number where possible
+def argument(value):
+	for kind in (int, float):
+		try: return kind(value)
+		except ValueError: pass
+	return value
+
+# Print health response in the layout of HealthStatus.sh
+def print_health(health):
+	print("Supervisor up for %.0f s" % health["uptime"])
+	print("Enabled Subsystems:")
+	for name, enabled in sorted(health["enabled"].items()):
+		if enabled: print("  " + name)
+	print("Enabled I2C Interfaces:")
+	for device in health["i2c"]:
+		if device["present"]: print("  " + device["name"])
+	if health["usb"]: print("USB device connected")
+	else: print("NO USB DEVICES FOUND!")
+	for name, result in sorted(health["windows"].items()):
+		when = time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(result["start"]))
+		if not result["ok"]: print("%s window at %s: FAILURE (%s)" % (name, when, result["error"]))
+		else: print("%s window at %s: %s" % (name, when, ", ".join("%s %s" % (key, result[key]) for key in ("samples", "bytes", "usb") if key in result)))
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("Usage: %s <command> [key=value ...]" % sys.argv[0])
+		sys.exit(1)
+	args = dict(arg.split('=', 1) for arg in sys.argv[2:])
+	response = command(sys.argv[1], **{key: argument(value) for key, value in args.items()})
+	if not response.pop("ok"):
+		print("Error: %s" % response["error"])
+		sys.exit(1)
+	if sys.argv[1] == "health": print_health(response)
+	elif response: print(json.dumps(response, indent = 2, sort_keys = True))
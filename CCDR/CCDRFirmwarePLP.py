@@ -1,9 +1,12 @@
 import sys
 import time
 import SC16IS750
+import RingBuffer
+import PLPStream
 import pigpio
 
 filename = 'data.txt'
+binfilename = 'data.bin'
 
 # I2C bus identifier
 I2C_BUS = 1
@@ -28,6 +31,10 @@ XTAL_FREQ_PLP = 11059200 # 1843200
 UART_BAUD_WTC = 115200
 UART_BAUD_PLP = 115200
 
+# RX FIFO trigger level for PLP chip programmed through TLR
+# Multiple of the 4 byte sample size leaving 16 bytes (~1.4 ms at 115200 baud) of headroom
+RX_TRIGGER_BYTES = 48
+
 # UART databits for communications chips
 UART_DATA_WTC = SC16IS750.LCR_DATABITS_8
 UART_DATA_PLP = SC16IS750.LCR_DATABITS_8
@@ -40,8 +47,8 @@ UART_STOP_PLP = SC16IS750.LCR_STOPBITS_1
 UART_PARITY_WTC = SC16IS750.LCR_PARITY_NONE
 UART_PARITY_PLP = SC16IS750.LCR_PARITY_NONE
 
-# Create buffer to store RX data
-data = {"WTC": [], "PLP": []}
+# Create preallocated ring buffer to store RX data until flushed to disk
+ring = RingBuffer.InterruptRing(16384)
 
 # Define lookup table for interrupts
 INTERRUPTS = {
@@ -93,8 +100,8 @@ def handle_comm_plp(gpio, level, tick):
 		reset_FIFO()
 		return
 
-	# Determine interrupt, error, and RX level statuses
-	irq, lsr, lvl = chip_plp.get_interrupt_status()
+	# Read statuses, then RX FIFO data in byte multiples defined above
+	irq, lsr, lvl, block = chip_plp.read_status_and_fifo(mult)
 
 	# Return if interrupt was already serviced
 	#if irq == SC16IS750.IIR_NONE: return
@@ -103,24 +110,17 @@ def handle_comm_plp(gpio, level, tick):
 	if irq == SC16IS750.IIR_RX_ERROR:
 		if lsr & SC16IS750.LSR_OVERFLOW_ERROR:
 			reset_FIFO()
-			data["PLP"].append([tick, irq, lsr, lvl, []])
+			ring.put(tick, irq, lsr, lvl, b'')
 			return
 
-	# Rapidly read RX FIFO data in byte multiples defined above and store
-	block = chip_plp.block_read(SC16IS750.REG_RHR, int(lvl/mult)*mult)
-	data["PLP"].append([tick, irq, lsr, lvl, block])
+	# Store data read from RX FIFO
+	ring.put(tick, irq, lsr, lvl, block)
 
 def reset_FIFO():
 	print("[%08X] Resetting FIFO ..." % pigpio.tickDiff(start, pi.get_current_tick()))
 
-	# Reset TX and RX FIFOs
-	fcr = SC16IS750.FCR_TX_FIFO_RESET | SC16IS750.FCR_RX_FIFO_RESET
-	chip_plp.byte_write(SC16IS750.REG_FCR, fcr)
-	time.sleep(2.0/XTAL_FREQ_PLP)
-
-	# Enable FIFOs and set RX FIFO trigger level
-	fcr = SC16IS750.FCR_FIFO_ENABLE | SC16IS750.FCR_RX_TRIGGER_56_BYTES
-	chip_plp.byte_write(SC16IS750.REG_FCR, fcr)
+	# Reset TX and RX FIFOs, then enable FIFOs leaving RX trigger level to TLR
+	chip_plp.reset_fifos(SC16IS750.FCR_FIFO_ENABLE)
 
 # Initialize pigpio
 pi = pigpio.pi()
@@ -141,6 +141,12 @@ pi.set_mode(PIN_IRQ_PLP, pigpio.INPUT)
 #chip_wtc = SC16IS750.SC16IS750(pi, I2C_BUS, I2C_ADDR_WTC, XTAL_FREQ_WTC, UART_BAUD_WTC, UART_DATA_WTC, UART_STOP_WTC, UART_PARITY_WTC)
 chip_plp = SC16IS750.SC16IS750(pi, I2C_BUS, I2C_ADDR_PLP, XTAL_FREQ_PLP, UART_BAUD_PLP, UART_DATA_PLP, UART_STOP_PLP, UART_PARITY_PLP)
 
+# Set RX FIFO trigger level with 4 byte granularity through enhanced TLR register
+success, tlr = chip_plp.set_trigger_levels(RX_TRIGGER_BYTES)
+if not success:
+	print("Error setting RX FIFO trigger level!")
+	sys.exit(1)
+
 # Define callbacks to handle RX from WTC and PLP comm chip
 #cb_wtc = pi.callback(PIN_IRQ_WTC, pigpio.FALLING_EDGE, handle_comm_wtc)
 cb_plp = pi.callback(PIN_IRQ_PLP, pigpio.FALLING_EDGE, handle_comm_plp)
@@ -152,6 +158,11 @@ chip_plp.byte_write_verify(SC16IS750.REG_IER, ier)
 start = pi.get_current_tick()
 print("[%08X] Waiting for data. Hit Ctrl+C to abort." % pigpio.tickDiff(start, pi.get_current_tick()))
 
+# Stream records from ring buffer to disk in the background
+writer = PLPStream.PLPStreamWriter(binfilename, start)
+flusher = RingBuffer.Flusher(ring, writer.write)
+flusher.start()
+
 # Clear FIFOs and set watchdog
 reset_FIFO()
 pi.set_watchdog(PIN_IRQ_PLP, 1000)
@@ -159,7 +170,7 @@ pi.set_watchdog(PIN_IRQ_PLP, 1000)
 # Enable emulator by sending byte with MSB set
 chip_plp.byte_write(SC16IS750.REG_THR, 0xE2)
 
-# Collect data and store in RAM until KeyboardInterrupt or timeout
+# Collect data until KeyboardInterrupt or timeout while flusher writes it to disk
 while pigpio.tickDiff(start, pi.get_current_tick()) < 0x35A4E900:
 	try: time.sleep(0.5)
 	except KeyboardInterrupt: break
@@ -171,38 +182,17 @@ cb_plp.cancel()
 # Disable emulator by sending byte with MSB unset
 chip_plp.byte_write(SC16IS750.REG_THR, 0x60)
 
-print("[%08X] Saving data to '%s' ..." % (pigpio.tickDiff(start, pi.get_current_tick()), filename))
+# Flush remaining records and close binary capture file
+flusher.stop()
+writer.close()
+print("[%08X] Ring buffer high-water mark: %d/%d records, dropped: %d records" % (pigpio.tickDiff(start, pi.get_current_tick()), ring.highwater, ring.capacity, ring.dropped))
+
+print("[%08X] Exporting '%s' to '%s' ..." % (pigpio.tickDiff(start, pi.get_current_tick()), binfilename, filename))
 
 # Close handle to serial converter chip and release pigpio object
 chip_plp.close()
 pi.write(PIN_PLP_ENABLE, 0) # active high
 pi.stop()
 
-# Write collected data from RAM to file
-savefile = open(filename, 'w')
-for board, values in data.items():
-	if board == "PLP":
-		while len(values) > 0:
-			tick, irq, lsr, num, block = values.pop(0)
-			tick = pigpio.tickDiff(start, tick)
-			#sys.stdout.write("(Board: %s) (Tick: %d) (IRQ: 0x%02X %-10s) (LSR: 0x%02X) (Bytes: %02d/%02d):" % (board, tick, irq, INTERRUPTS.get(irq), lsr, len(block), num))
-			savefile.write("%08X, %02X, %02X, %02X" % (tick, irq, lsr, int(len(block)/4)))
-			data = 0
-			for i in range(len(block)):
-				if i % 4 == 0:
-					#sys.stdout.write(" 0x")
-					savefile.write(", ")
-					data = 0
-				data |= (block[i] << (3 - (i % 4)) * 8)
-				if i % 4 == 3:
-					#sys.stdout.write("%08X" % data)
-					savefile.write("%08X" % data)
-			#sys.stdout.write("\n")
-			savefile.write("\n")
-
-			#if lsr & SC16IS750.LSR_OVERFLOW_ERROR:
-			#	raise ValueError("Fatal overflow error encountered.")
-			#if lsr & SC16IS750.LSR_FIFO_DATA_ERROR:
-			#	raise ValueError("Fatal FIFO data error encountered.")
-
-savefile.close()
+# Convert binary capture file to text
+PLPStream.export_text(binfilename, filename)
@@ -1,57 +1,115 @@
 import sys
+import numpy as np
 
-T = []
-I = []
-L = []
-N = []
-D = []
-mismatch = 0
-print("Parsing 'data.txt' ...")
-with open('data.txt', 'r') as f:
-	for line in f:
-		values = line.split(', ')
-		t = int(values[0], 16)
-		i = int(values[1], 16)
-		l = int(values[2], 16)
-		n = int(values[3], 16)
-		if n != len(values) - 4:
-			print("Sample quantity mismatch detected at %08X" % t)
-			mismatch += 1
-		if n == 0:
-			T.append(t)
-			I.append(i)
-			L.append(l)
-			N.append(n)
-			D.append(None)
-		else:
-			T.extend([int(values[0], 16)]*n)
-			I.extend([int(values[1], 16)]*n)
-			L.extend([int(values[2], 16)]*n)
-			N.extend([int(values[3], 16)]*n)
-			d = []
-			for i in range(4, len(values)):
-				d.append(int(values[i], 16))
-			D.extend(d)
-
-overflows = 0
-discontin = 0
-for i in range(len(T)):
-	if I[i] == 0x06:
-		try: sys.stdout.write("RX error causing %d missed samples detected: " % (D[i+1] - D[i-1] - 1))
-		except TypeError: sys.stdout.write("RX error causing unknown missed samples detected: ")
-		overflows += 1
-	if I[i] != 0x0C and I[i] != 0x04 and I[i] != 0x01:
-		if D[i] is None:
-			print("0x%08X 0x%02X 0x%02X 0x%02X None" % (T[i], I[i], L[i], N[i]))
-		else:
-			print("0x%08X 0x%02X 0x%02X 0x%02X 0x%08X" % (T[i], I[i], L[i], N[i], D[i]))
-	if i > 0:
-		if D[i] is None or D[i-1] is None: pass
-		elif (D[i] - D[i-1]) != 1:
-			print("Discontinuity of %d samples with unknown cause detected at 0x%08X!" % (D[i] - D[i-1] - 1, T[i]))
-			discontin += 1
-
-print()
-print("Packet mismatch: %d" % mismatch)
-print("Receive errors:  %d" % overflows)
-print("Discontinuities: %d" % discontin)
+# IRQ values (IIR[5:0]) expected during normal data collection
+IRQ_RX_ERROR = 0x06
+IRQ_NORMAL = [0x0C, 0x04, 0x01]
+
+# Parse file of "TTTTTTTT, II, LL, NN, DDDDDDDD, ..." lines written by CCDRFirmwarePLP.py
+# Every data word becomes one sample carrying the tick, IRQ, LSR, and count of its line;
+# lines without data words become a single sample with no valid data
+# Return tuple of (T, I, L, N, D, valid, mismatch) where mismatch holds ticks of lines
+# whose sample count disagrees with the number of data words
+def load(filename):
+	with open(filename, 'rb') as f:
+		text = f.read()
+	if text and not text.endswith(b'\n'): text += b'\n'
+	raw = np.frombuffer(text, dtype = np.uint8)
+
+	# Every token is terminated by either a comma or a newline and commas are followed by a space
+	separators = np.flatnonzero((raw == ord('\n')) | (raw == ord(',')))
+	if len(separators) == 0:
+		empty = np.zeros(0, dtype = np.int64)
+		return (empty, empty, empty, empty, empty, np.zeros(0, dtype = bool), empty)
+	newline = raw[separators] == ord('\n')
+	starts = np.empty(len(separators), dtype = np.int64)
+	starts[0] = 0
+	starts[1:] = separators[:-1] + 1 + ~newline[:-1]
+	ndigits = separators - starts
+	if np.any(ndigits & 1) or np.any(ndigits > 8):
+		raise ValueError("hex fields must have an even number of at most eight digits")
+
+	# Decode all hex digits at once and reassemble each token from its big-endian bytes
+	# (padded so that empty tokens, e.g. blank lines at the end, also read four bytes)
+	digits = bytes.fromhex(text.translate(None, b', \n').decode('ascii'))
+	octets = np.frombuffer(digits + bytes(4), dtype = np.uint8).astype(np.int64)
+	nbytes = ndigits // 2
+	offset = np.cumsum(nbytes) - nbytes
+	values = octets[offset] << 24 | octets[offset + 1] << 16 | octets[offset + 2] << 8 | octets[offset + 3]
+	values >>= 8*(4 - nbytes)
+
+	# Group tokens into lines, skipping lines too short to hold a header
+	lineof = np.cumsum(newline) - newline
+	perline = np.bincount(lineof)
+	linestart = np.cumsum(perline) - perline
+	keep = perline >= 4
+	perline = perline[keep]
+	linestart = linestart[keep]
+
+	t = values[linestart]
+	i = values[linestart + 1]
+	l = values[linestart + 2]
+	n = values[linestart + 3]
+	k = perline - 4
+	mismatch = t[n != k]
+
+	# Expand line headers to one entry per data word (or one entry for empty lines)
+	rows = np.maximum(k, 1)
+	line = np.repeat(np.arange(len(rows)), rows)
+	rowstart = np.cumsum(rows) - rows
+	offset = np.arange(len(line)) - rowstart[line]
+	valid = k[line] > 0
+	D = np.where(valid, values[np.where(valid, linestart[line] + 4 + offset, 0)], -1)
+
+	return (t[line], i[line], l[line], n[line], D, valid, mismatch)
+
+# Locate anomalies in parsed samples
+# Return tuple of boolean masks (rx errors, unexpected IRQs, discontinuities) along with
+# number of samples missed around every RX error (-1 if unknown) and size of every discontinuity
+def analyze(I, D, valid):
+	rxerror = I == IRQ_RX_ERROR
+	unexpected = ~np.isin(I, IRQ_NORMAL)
+
+	# Samples between neighbours of an RX error, known only if both neighbours hold data
+	missed = np.full(len(D), -1, dtype = np.int64)
+	if len(D) > 2:
+		known = valid[:-2] & valid[2:]
+		missed[1:-1] = np.where(known, D[2:] - D[:-2] - 1, -1)
+
+	# Consecutive samples must increment by exactly one
+	gaps = np.zeros(len(D), dtype = np.int64)
+	discontinuity = np.zeros(len(D), dtype = bool)
+	if len(D) > 1:
+		gaps[1:] = D[1:] - D[:-1] - 1
+		discontinuity[1:] = valid[1:] & valid[:-1] & (gaps[1:] != 0)
+
+	return (rxerror, unexpected, discontinuity, missed, gaps)
+
+def main(filename = 'data.txt'):
+	print("Parsing '%s' ..." % filename)
+	T, I, L, N, D, valid, mismatch = load(filename)
+	for t in mismatch:
+		print("Sample quantity mismatch detected at %08X" % t)
+
+	rxerror, unexpected, discontinuity, missed, gaps = analyze(I, D, valid)
+
+	# Only visit samples with something to report
+	for i in np.flatnonzero(rxerror | unexpected | discontinuity):
+		if rxerror[i]:
+			if missed[i] >= 0: sys.stdout.write("RX error causing %d missed samples detected: " % missed[i])
+			else: sys.stdout.write("RX error causing unknown missed samples detected: ")
+		if unexpected[i]:
+			if not valid[i]:
+				print("0x%08X 0x%02X 0x%02X 0x%02X None" % (T[i], I[i], L[i], N[i]))
+			else:
+				print("0x%08X 0x%02X 0x%02X 0x%02X 0x%08X" % (T[i], I[i], L[i], N[i], D[i]))
+		if discontinuity[i]:
+			print("Discontinuity of %d samples with unknown cause detected at 0x%08X!" % (gaps[i], T[i]))
+
+	print()
+	print("Packet mismatch: %d" % len(mismatch))
+	print("Receive errors:  %d" % np.count_nonzero(rxerror))
+	print("Discontinuities: %d" % np.count_nonzero(discontinuity))
+
+if __name__ == "__main__":
+	main(*sys.argv[1:2])
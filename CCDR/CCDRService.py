@@ -0,0 +1,269 @@
+import sys
+import time
+import signal
+import asyncio
+import pigpio
+import CCDR
+import SC16IS750
+import RingBuffer
+import PLPStream
+
+binfilename = 'data.bin'
+
+# I2C bus identifier
+I2C_BUS = 1
+
+# I2C addresses for communications chips
+I2C_ADDR_WTC = 0x4C
+I2C_ADDR_PLP = 0x4D
+
+# Crystal frequencies for communications chips
+XTAL_FREQ_WTC = 11059200 # 1843200
+XTAL_FREQ_PLP = 11059200 # 1843200
+
+# UART baudrates for communications chips
+UART_BAUD_WTC = 115200
+UART_BAUD_PLP = 115200
+
+# RX FIFO trigger levels programmed through TLR
+# WTC messages are short, so trigger early and rely on RX timeout for the tail of a message
+RX_TRIGGER_WTC = 16
+RX_TRIGGER_PLP = 48
+
+# Bytes per sample, only whole samples are drained from the RX FIFO
+SAMPLE_BYTES_WTC = 1
+SAMPLE_BYTES_PLP = 4
+
+# Maximum number of drained blocks waiting in each channel queue before new blocks are dropped
+QUEUE_DEPTH = 1024
+
+# Watchdog timeout recovering from missed IRQ edges (ms)
+WATCHDOG_MS = 100
+
+# Maximum number of drains per interrupt while IRQ remains asserted, bounding the time
+# one chip can hold the callback thread before the other chip is serviced
+MAX_PASSES = 4
+
+# Interval between status reports (s)
+STATUS_INTERVAL = 10.0
+
+# Delimiter and maximum length of WTC messages
+WTC_DELIMITER = b'\n'
+WTC_MAX_MESSAGE = 256
+
+CALLBACK_FALLING  = 0
+CALLBACK_RISING   = 1
+CALLBACK_WATCHDOG = 2
+
+# Split a byte stream into delimited messages, carrying partial messages between blocks
+# Messages longer than maxlen are cut and counted as overlong
+class DelimiterFramer:
+	def __init__(self, delimiter = WTC_DELIMITER, maxlen = WTC_MAX_MESSAGE):
+		self.delimiter = delimiter
+		self.maxlen = maxlen
+		self.partial = bytearray()
+		self.overlong = 0
+
+	# Return list of complete messages (without delimiter) found after adding block
+	def feed(self, block):
+		self.partial += block
+		*messages, self.partial = self.partial.split(self.delimiter)
+		if len(self.partial) > self.maxlen:
+			messages.append(self.partial[:self.maxlen])
+			del self.partial[:self.maxlen]
+			self.overlong += 1
+		return [bytes(m) for m in messages]
+
+	# Discard partial message after data loss
+	def reset(self):
+		self.partial = bytearray()
+
+# One SC16IS750 serviced from pigpio callbacks, handing drained blocks to an asyncio queue
+# The pigpio callback thread only drains the chip and schedules delivery on the event loop,
+# so one busy consumer can never hold up draining either chip
+# There is no back-pressure: the queue is bounded, and blocks drained while it is full are dropped
+# and counted in dropped
+class UARTChannel:
+	def __init__(self, loop, name, chip, gpio, trigger = 0, mult = 1, depth = QUEUE_DEPTH):
+		self.loop = loop
+		self.name = name
+		self.chip = chip
+		self.gpio = gpio
+		self.trigger = trigger
+		self.mult = mult
+		self.queue = asyncio.Queue(depth)
+		self.cb = None
+
+		# Statistics
+		self.interrupts = 0
+		self.watchdogs = 0
+		self.overflows = 0
+		self.dropped = 0
+		self.received = 0
+		self.highwater = 0
+
+	# Program trigger level, clear FIFOs, and start servicing interrupts
+	def start(self, watchdog = WATCHDOG_MS):
+		if self.trigger > 0:
+			success, tlr = self.chip.set_trigger_levels(self.trigger)
+			if not success: return False
+		self.chip.reset_fifos(SC16IS750.FCR_FIFO_ENABLE)
+		self.cb = self.chip.pi.callback(self.gpio, pigpio.FALLING_EDGE, self.isr)
+		ier = SC16IS750.IER_RX_ERROR | SC16IS750.IER_RX_READY
+		success, ier = self.chip.byte_write_verify(SC16IS750.REG_IER, ier)
+		self.chip.pi.set_watchdog(self.gpio, watchdog)
+		return success
+
+	# Stop servicing interrupts, waiting for any callback in progress
+	def stop(self):
+		self.chip.pi.set_watchdog(self.gpio, 0)
+		if self.cb is not None: self.cb.cancel()
+		self.cb = None
+		self.chip.byte_write(SC16IS750.REG_IER, 0x00)
+
+	# Interrupt service routine running in pigpio callback thread
+	def isr(self, gpio, level, tick):
+
+		# Verify correct GPIO caused the interrupt
+		if gpio != self.gpio: return
+
+		# Watchdog also drains, recovering data left behind by a missed falling edge
+		if level == CALLBACK_WATCHDOG: self.watchdogs += 1
+		else: self.interrupts += 1
+
+		# IRQ stays low if the trigger level is reached again while draining, which produces no
+		# further falling edge, so keep draining until the line is released
+		for i in range(MAX_PASSES):
+
+			# Checking the line is much cheaper than an I2C transaction and skips queued edges
+			# whose data was already taken by an earlier pass
+			if self.chip.pi.read(self.gpio): return
+			if i > 0: tick = self.chip.pi.get_current_tick()
+
+			# Read statuses, then whole samples of RX FIFO data
+			irq, lsr, lvl, block = self.chip.read_status_and_fifo(self.mult)
+
+			# If RX overflow error, data is unusable, so resynchronize
+			if irq == SC16IS750.IIR_RX_ERROR and lsr & SC16IS750.LSR_OVERFLOW_ERROR:
+				self.overflows += 1
+				self.chip.reset_fifos(SC16IS750.FCR_FIFO_ENABLE)
+				block = bytearray()
+			elif irq == SC16IS750.IIR_NONE and not block: return
+
+			self.loop.call_soon_threadsafe(self.deliver, (tick, irq, lsr, lvl, block))
+
+	# Queue drained block on event loop, dropping it (bounded dropping, not back-pressure) if the
+	# consumer has fallen behind
+	def deliver(self, record):
+		try: self.queue.put_nowait(record)
+		except asyncio.QueueFull:
+			self.dropped += 1
+			return
+		self.received += len(record[4])
+		if self.queue.qsize() > self.highwater: self.highwater = self.queue.qsize()
+
+	# Queue bytes for transmission
+	def send(self, block):
+		self.chip.block_write(SC16IS750.REG_THR, block)
+
+	def status(self):
+		return "%s: %d bytes, %d interrupts, %d watchdogs, %d overflows, %d dropped, queue %d/%d (high-water %d)" % (self.name, self.received, self.interrupts, self.watchdogs, self.overflows, self.dropped, self.queue.qsize(), self.queue.maxsize, self.highwater)
+
+# Frame WTC messages and report them
+async def consume_wtc(channel, framer, start):
+	while True:
+		tick, irq, lsr, lvl, block = await channel.queue.get()
+		if not block: framer.reset()
+		for message in framer.feed(block):
+			print("[%08X] %s: %r" % (pigpio.tickDiff(start, tick), channel.name, message))
+
+# Store PLP blocks in ring buffer drained to disk by flusher thread
+async def consume_plp(channel, ring):
+	while True:
+		record = await channel.queue.get()
+		ring.put(*record)
+		# Store everything already waiting before yielding to other channel
+		while not channel.queue.empty():
+			ring.put(*channel.queue.get_nowait())
+
+async def report(channels, start, pi, interval = STATUS_INTERVAL):
+	while True:
+		await asyncio.sleep(interval)
+		for channel in channels:
+			print("[%08X] %s" % (pigpio.tickDiff(start, pi.get_current_tick()), channel.status()))
+
+async def run(duration = None):
+	loop = asyncio.get_running_loop()
+	stopped = asyncio.Event()
+	loop.add_signal_handler(signal.SIGINT, stopped.set)
+	loop.add_signal_handler(signal.SIGTERM, stopped.set)
+
+	# Initialize pigpio and CCDR pins, leaving outputs of subsystems already running as they are, then power PLP
+	pi = pigpio.pi()
+	ccdr = CCDR.CCDR(pi, reset_outputs = False)
+	ccdr.enable_plp(True)
+	time.sleep(0.1)
+	pi.set_mode(CCDR.PI_PIN_WTC_COMM_IRQ, pigpio.INPUT)
+	pi.set_mode(CCDR.PI_PIN_PLP_COMM_IRQ, pigpio.INPUT)
+
+	# Initialize SC16IS750 chips
+	chip_wtc = SC16IS750.SC16IS750(pi, I2C_BUS, I2C_ADDR_WTC, XTAL_FREQ_WTC, UART_BAUD_WTC)
+	chip_plp = SC16IS750.SC16IS750(pi, I2C_BUS, I2C_ADDR_PLP, XTAL_FREQ_PLP, UART_BAUD_PLP)
+	wtc = UARTChannel(loop, "WTC", chip_wtc, CCDR.PI_PIN_WTC_COMM_IRQ, RX_TRIGGER_WTC, SAMPLE_BYTES_WTC)
+	plp = UARTChannel(loop, "PLP", chip_plp, CCDR.PI_PIN_PLP_COMM_IRQ, RX_TRIGGER_PLP, SAMPLE_BYTES_PLP)
+	channels = [wtc, plp]
+
+	start = pi.get_current_tick()
+
+	# Stream PLP records from ring buffer to disk in the background
+	ring = RingBuffer.InterruptRing(16384)
+	writer = PLPStream.PLPStreamWriter(binfilename, start)
+	flusher = RingBuffer.Flusher(ring, writer.write)
+	flusher.start()
+
+	tasks = [
+		loop.create_task(consume_wtc(wtc, DelimiterFramer(), start)),
+		loop.create_task(consume_plp(plp, ring)),
+		loop.create_task(report(channels, start, pi))
+	]
+
+	for channel in channels:
+		if not channel.start():
+			print("Error starting %s channel!" % channel.name)
+			stopped.set()
+
+	# Enable emulator by sending byte with MSB set
+	plp.send(b'\xE2')
+	print("[%08X] Servicing WTC and PLP. Hit Ctrl+C to abort." % pigpio.tickDiff(start, pi.get_current_tick()))
+
+	try: await asyncio.wait_for(stopped.wait(), duration)
+	except asyncio.TimeoutError: pass
+
+	# Stop callbacks before event loop stops accepting deliveries
+	for channel in channels:
+		channel.stop()
+
+	# Disable emulator by sending byte with MSB unset
+	plp.send(b'\x60')
+
+	# Let consumers store everything already delivered
+	await asyncio.sleep(0)
+	while not all(channel.queue.empty() for channel in channels):
+		await asyncio.sleep(0.01)
+	for task in tasks:
+		task.cancel()
+	await asyncio.gather(*tasks, return_exceptions = True)
+
+	flusher.stop()
+	writer.close()
+	for channel in channels:
+		print("[%08X] %s" % (pigpio.tickDiff(start, pi.get_current_tick()), channel.status()))
+	print("[%08X] Ring buffer high-water mark: %d/%d records, dropped: %d records" % (pigpio.tickDiff(start, pi.get_current_tick()), ring.highwater, ring.capacity, ring.dropped))
+
+	chip_wtc.close()
+	chip_plp.close()
+	ccdr.enable_plp(False)
+	pi.stop()
+
+if __name__ == "__main__":
+	asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else None))
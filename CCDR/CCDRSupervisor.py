@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import pigpio
+import CCDR
+import SC16IS750
+import RingBuffer
+import PLPStream
+import CCDRService
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Electrometer'))
+import smbus
+import ElectrometerFile
+import ElectrometerSampler
+
+# Local socket accepting one JSON request per line and answering with one JSON response per line
+SOCKET_PATH = '/tmp/ccdr.sock'
+
+# Directory acquisition windows are saved to
+DATA_DIR = 'data'
+
+# Time for a freshly enabled subsystem to power up before it is used (s)
+ENABLE_SETTLE = 1.0
+
+# Longest acquisition window accepted (s)
+MAX_WINDOW = 3600.0
+
+# Subsystems controlled by the supervisor and their enable pins
+SUBSYSTEMS = CCDR.SUBSYSTEM_PINS
+
+# I2C devices probed by health checks
+I2C_DEVICES = [
+	(0x48, "Electrometer Channel 1"),
+	(0x49, "Electrometer Channel 2"),
+	(CCDRService.I2C_ADDR_WTC, "WTC Communications Chip"),
+	(CCDRService.I2C_ADDR_PLP, "PLP Communications Chip")
+]
+
+# USB vendor of Linux root hubs, which are always present
+USB_ROOT_HUB_VENDOR = '1d6b'
+
+# Connected USB devices other than root hubs as list of "vendor:product" strings
+def usb_devices(path = '/sys/bus/usb/devices'):
+	devices = []
+	for name in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+		try:
+			with open(os.path.join(path, name, 'idVendor')) as f: vendor = f.read().strip()
+			with open(os.path.join(path, name, 'idProduct')) as f: product = f.read().strip()
+		except OSError:
+			continue
+		if vendor != USB_ROOT_HUB_VENDOR: devices.append(vendor + ':' + product)
+	return devices
+
+# Raised for malformed requests; reported back to the client instead of stopping the supervisor
+class RequestError(Exception):
+	pass
+
+# Resident process holding pigpio and CCDR outputs open, running acquisition windows of every
+# subsystem on request or on a schedule, and answering requests on a local socket
+# Windows of one subsystem never overlap; a window enables its subsystem if needed, waits for it to
+# power up, and restores the previous enable state afterwards
+class Supervisor:
+	def __init__(self, pi, loop):
+		self.pi = pi
+		self.loop = loop
+		# Keep subsystems enabled before the supervisor started (or restarted) running
+		self.ccdr = CCDR.CCDR(pi, reset_outputs = False)
+		self.bus = None
+		self.started = time.time()
+
+		self.locks = {name: asyncio.Lock() for name in SUBSYSTEMS}
+		# Scheduled windows as subsystem -> (task, seconds, every)
+		self.schedules = {}
+		# Result of most recent window of every subsystem
+		self.results = {}
+
+	def subsystem(self, request):
+		return self.check_subsystem(request.get("subsystem"))
+
+	def check_subsystem(self, name):
+		if name not in SUBSYSTEMS: raise RequestError("unknown subsystem %r" % name)
+		return name
+
+	# Enables and resets would pull the subsystem out from under a running window, so they are
+	# refused until it finishes
+	def check_idle(self, name):
+		if self.locks[name].locked(): raise RequestError("%s window in progress" % name)
+		return name
+
+	# Dictionary mapping subsystem names to booleans sets their enable states in one pair of bank writes
+	def set_enables(self, states):
+		self.ccdr.generic_enable_many({gpio: state for name, state in states.items() for gpio in SUBSYSTEMS[name]})
+
+	def seconds(self, request, key = "seconds"):
+		try: seconds = float(request[key])
+		except (KeyError, TypeError, ValueError): raise RequestError("%s must be a number" % key)
+		if not 0 < seconds <= MAX_WINDOW: raise RequestError("%s must be between 0 and %g" % (key, MAX_WINDOW))
+		return seconds
+
+	def enabled(self, name):
+		return self.pi.read(SUBSYSTEMS[name][0]) == 1
+
+	# Probe I2C address with an SMBus quick write, which never touches device registers or FIFOs
+	def i2c_present(self, addr):
+		try:
+			handle = self.pi.i2c_open(CCDRService.I2C_BUS, addr)
+		except pigpio.error:
+			return False
+		try:
+			self.pi.i2c_write_quick(handle, 0)
+			return True
+		except pigpio.error:
+			return False
+		finally:
+			self.pi.i2c_close(handle)
+
+	async def handle(self, request):
+		cmd = request.get("cmd")
+		handler = getattr(self, "cmd_" + str(cmd), None)
+		if handler is None: raise RequestError("unknown command %r" % cmd)
+		return await handler(request)
+
+	async def cmd_ping(self, request):
+		return {"uptime": time.time() - self.started}
+
+	async def cmd_health(self, request):
+		return {
+			"uptime":    time.time() - self.started,
+			"enabled":   {name: self.enabled(name) for name in SUBSYSTEMS},
+			"plp_ready": self.pi.read(CCDR.PI_PIN_PLP_STATUS) == 1,
+			"i2c":       [{"addr": addr, "name": name, "present": self.i2c_present(addr)} for addr, name in I2C_DEVICES],
+			"usb":       usb_devices(),
+			"windows":   self.results,
+			"schedules": {name: {"seconds": seconds, "every": every} for name, (task, seconds, every) in self.schedules.items()}
+		}
+
+	async def cmd_enable(self, request):
+		name = self.check_idle(self.subsystem(request))
+		self.set_enables({name: True})
+		return {"enabled": {name: self.enabled(name)}}
+
+	async def cmd_disable(self, request):
+		name = self.check_idle(self.subsystem(request))
+		self.set_enables({name: False})
+		return {"enabled": {name: self.enabled(name)}}
+
+	async def cmd_reset(self, request):
+		if self.subsystem(request) != "plp": raise RequestError("only plp can be reset")
+		self.check_idle("plp")
+		self.ccdr.reset_plp()
+		return {}
+
+	# Batch of enables, disables and resets applied together once every name has been checked, so
+	# either the whole batch or none of it takes effect
+	async def cmd_apply(self, request):
+		enable = [self.check_subsystem(name) for name in request.get("enable", [])]
+		disable = [self.check_subsystem(name) for name in request.get("disable", [])]
+		reset = [self.check_subsystem(name) for name in request.get("reset", [])]
+		if set(enable) & set(disable): raise RequestError("subsystem both enabled and disabled")
+		if any(name != "plp" for name in reset): raise RequestError("only plp can be reset")
+		for name in set(enable + disable + reset): self.check_idle(name)
+		states = {name: True for name in enable}
+		states.update({name: False for name in disable})
+		self.set_enables(states)
+		if reset: self.ccdr.reset_plp()
+		return {"enabled": {name: self.enabled(name) for name in SUBSYSTEMS}}
+
+	async def cmd_acquire(self, request):
+		return await self.window(self.subsystem(request), self.seconds(request))
+
+	async def cmd_schedule(self, request):
+		name = self.subsystem(request)
+		seconds = self.seconds(request)
+		every = self.seconds(request, "every")
+		if every <= seconds + ENABLE_SETTLE: raise RequestError("every must be longer than seconds plus %g s settling" % ENABLE_SETTLE)
+		self.unschedule(name)
+		self.schedules[name] = (self.loop.create_task(self.repeat(name, seconds, every)), seconds, every)
+		return {}
+
+	async def cmd_unschedule(self, request):
+		self.unschedule(self.subsystem(request))
+		return {}
+
+	def unschedule(self, name):
+		if name in self.schedules:
+			self.schedules.pop(name)[0].cancel()
+
+	# Run window every interval, starting immediately
+	# window() records failures in results instead of raising, so one failed window never ends the schedule
+	async def repeat(self, name, seconds, every):
+		while True:
+			begin = self.loop.time()
+			await self.window(name, seconds)
+			await asyncio.sleep(max(every - (self.loop.time() - begin), 0))
+
+	# Run one acquisition window, recording and returning its result
+	# Any error of the window, including failing to restore the enable state, is recorded in the result
+	async def window(self, name, seconds):
+		async with self.locks[name]:
+			result = {"start": time.time(), "seconds": seconds}
+			enabled = True
+			try:
+				if not os.path.isdir(DATA_DIR): os.makedirs(DATA_DIR)
+				enabled = self.enabled(name)
+				if not enabled:
+					self.set_enables({name: True})
+					await asyncio.sleep(ENABLE_SETTLE)
+				result.update(await getattr(self, "window_" + name)(seconds))
+				result["ok"] = True
+			except asyncio.CancelledError:
+				result.update({"ok": False, "error": "cancelled"})
+				raise
+			except Exception as e:
+				result.update({"ok": False, "error": "%s: %s" % (type(e).__name__, e)})
+			finally:
+				if not enabled:
+					try: self.set_enables({name: False})
+					except Exception as e: result.update({"ok": False, "error": "error disabling %s: %s: %s" % (name, type(e).__name__, e)})
+				self.results[name] = result
+		return result
+
+	# Sample both electrometer ADCs into binary file
+	async def window_electrometer(self, seconds):
+		if self.bus is None: self.bus = smbus.SMBus(ElectrometerSampler.DEVICE_BUS)
+		queue = RingBuffer.RingBuffer(ElectrometerFile.SAMPLE_DTYPE, 65536)
+		sampler = ElectrometerSampler.ElectrometerSampler(self.pi, self.bus, queue.put)
+		filename = os.path.join(DATA_DIR, str(int(time.time())) + '.bin')
+		datafile = ElectrometerFile.ElectrometerFileWriter(filename, sampler.pga, sampler.dr, sampler.config_word(sampler.channels[0]), self.pi.get_current_tick())
+		writer = RingBuffer.Flusher(queue, datafile.write, datafile.flush, interval = 1.0, batch = 4096)
+		writer.start()
+		try:
+			sampler.start()
+			await asyncio.sleep(seconds)
+		finally:
+			sampler.stop()
+			writer.stop()
+			datafile.close()
+		return {"file": filename, "samples": sum(sampler.samples), "overruns": queue.dropped}
+
+	# Stream PLP data through SC16IS750 into binary capture file
+	async def window_plp(self, seconds):
+		self.pi.set_mode(CCDR.PI_PIN_PLP_COMM_IRQ, pigpio.INPUT)
+		chip = SC16IS750.SC16IS750(self.pi, CCDRService.I2C_BUS, CCDRService.I2C_ADDR_PLP, CCDRService.XTAL_FREQ_PLP, CCDRService.UART_BAUD_PLP)
+		channel = CCDRService.UARTChannel(self.loop, "PLP", chip, CCDR.PI_PIN_PLP_COMM_IRQ, CCDRService.RX_TRIGGER_PLP, CCDRService.SAMPLE_BYTES_PLP)
+		filename = os.path.join(DATA_DIR, str(int(time.time())) + '.plp')
+		ring = RingBuffer.InterruptRing(16384)
+		writer = PLPStream.PLPStreamWriter(filename, self.pi.get_current_tick())
+		flusher = RingBuffer.Flusher(ring, writer.write)
+		flusher.start()
+		consumer = self.loop.create_task(CCDRService.consume_plp(channel, ring))
+		try:
+			if not channel.start(): raise RuntimeError("error starting PLP channel")
+			# Enable emulator by sending byte with MSB set
+			channel.send(b'\xE2')
+			await asyncio.sleep(seconds)
+		finally:
+			channel.stop()
+			# Disable emulator by sending byte with MSB unset
+			channel.send(b'\x60')
+			while not channel.queue.empty():
+				await asyncio.sleep(0.01)
+			consumer.cancel()
+			await asyncio.gather(consumer, return_exceptions = True)
+			flusher.stop()
+			writer.close()
+			chip.close()
+		return {"file": filename, "bytes": channel.received, "overflows": channel.overflows, "dropped": channel.dropped + ring.dropped}
+
+	# Picoscope captures are run by the Picoscope scripts; the supervisor only powers the scope and
+	# checks that it enumerates on USB
+	async def window_picoscope(self, seconds):
+		await asyncio.sleep(seconds)
+		return {"usb": usb_devices()}
+
+	# Serve requests of one client connection until it closes
+	async def client(self, reader, writer):
+		try:
+			while True:
+				line = await reader.readline()
+				if not line: break
+				try:
+					request = json.loads(line)
+					if not isinstance(request, dict): raise RequestError("request must be an object")
+					response = {"ok": True}
+					response.update(await self.handle(request))
+				except (ValueError, RequestError) as e:
+					response = {"ok": False, "error": str(e)}
+				except Exception as e:
+					# Hardware errors such as pigpio.error fail the request, not the connection
+					response = {"ok": False, "error": "%s: %s" % (type(e).__name__, e)}
+				writer.write(json.dumps(response).encode() + b'\n')
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+	def stop(self):
+		for name in list(self.schedules):
+			self.unschedule(name)
+
+async def run(path = SOCKET_PATH):
+	loop = asyncio.get_running_loop()
+	stopped = asyncio.Event()
+	loop.add_signal_handler(signal.SIGINT, stopped.set)
+	loop.add_signal_handler(signal.SIGTERM, stopped.set)
+
+	pi = pigpio.pi()
+	supervisor = Supervisor(pi, loop)
+
+	# Remove socket left behind by a supervisor that did not exit cleanly
+	if os.path.exists(path): os.remove(path)
+	server = await asyncio.start_unix_server(supervisor.client, path)
+	print("Supervisor listening on '%s'. Hit Ctrl+C to abort." % path)
+
+	await stopped.wait()
+
+	server.close()
+	await server.wait_closed()
+	supervisor.stop()
+	# Let windows in progress stop their subsystems
+	for lock in supervisor.locks.values():
+		async with lock: pass
+	os.remove(path)
+	pi.stop()
+
+if __name__ == "__main__":
+	asyncio.run(run(sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH))
@@ -0,0 +1,170 @@
+import sys
+import time
+import struct
+import numpy as np
+
+### PLP BINARY CAPTURE FORMAT ###
+#
+#  ######## 20 BYTE HEADER ########
+#  #  4 bytes - Magic ('PLPS')
+#  #  1 byte  - Format version
+#  #  3 bytes - Unused
+#  #  4 bytes - pigpio tick at start of capture
+#  #  8 bytes - Host time at start of capture (integer number of nanoseconds)
+#  ###############################
+#
+#  ######## CHUNK (REPEATED) ########
+#  #  4 bytes - Number of records (R)
+#  #  4 bytes - Number of data words (W)
+#  #  R * 7 bytes - Record headers
+#  #    4 bytes - pigpio tick of interrupt
+#  #    1 byte  - IRQ (IIR[5:0])
+#  #    1 byte  - LSR
+#  #    1 byte  - Number of data words in record
+#  #  W * 4 bytes - Data words of all records in order
+#  ##################################
+#
+# All values are big-endian. One chunk is written per flush, so a file is
+# valid up to the last complete chunk even if capture is interrupted.
+#
+##################################
+
+MAGIC = b'PLPS'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('>4sB3xIq')
+CHUNK_HEADER = struct.Struct('>II')
+
+RECORD_DTYPE = np.dtype([
+	("tick",  ">u4"),
+	("irq",   "u1"),
+	("lsr",   "u1"),
+	("count", "u1")
+])
+
+WORD_DTYPE = np.dtype('>u4')
+
+# Streaming writer fed with RingBuffer record slices
+class PLPStreamWriter:
+	def __init__(self, filename, start_tick, start_ns = None):
+		if start_ns is None: start_ns = time.time_ns()
+		self.fh = open(filename, 'wb')
+		self.fh.write(FILE_HEADER.pack(MAGIC, VERSION, start_tick & 0xFFFFFFFF, start_ns))
+		self.records = 0
+		self.words = 0
+
+	# Append one chunk holding a slice of RingBuffer.RECORD_DTYPE records
+	def write(self, records):
+		n = len(records)
+		if n == 0: return
+
+		# Only whole 4-byte samples are stored
+		counts = records["num"] // 4
+		headers = np.empty(n, dtype = RECORD_DTYPE)
+		headers["tick"]  = records["tick"]
+		headers["irq"]   = records["irq"]
+		headers["lsr"]   = records["lsr"]
+		headers["count"] = counts
+
+		# Gather valid data bytes of every record into one contiguous block
+		data = records["data"]
+		mask = np.arange(data.shape[1]) < (4*counts.astype(np.intp))[:, None]
+		words = data[mask]
+
+		self.fh.write(CHUNK_HEADER.pack(n, len(words)//4))
+		self.fh.write(headers.tobytes())
+		self.fh.write(words.tobytes())
+		self.records += n
+		self.words += len(words)//4
+
+	def flush(self):
+		self.fh.flush()
+
+	def close(self):
+		self.fh.close()
+
+# Load capture file written by PLPStreamWriter
+# Return tuple of (start tick, start ns, record headers, data words, index of first word of each record)
+def load(filename):
+	raw = np.fromfile(filename, dtype = np.uint8)
+	if len(raw) < FILE_HEADER.size:
+		raise ValueError("file too short to contain header")
+	magic, version, start_tick, start_ns = FILE_HEADER.unpack_from(raw, 0)
+	if magic != MAGIC: raise ValueError("not a PLP capture file")
+	if version != VERSION: raise ValueError("unsupported PLP capture version %d" % version)
+
+	# Walk chunk headers only; records and words are sliced out as whole arrays
+	headers = []
+	words = []
+	pos = FILE_HEADER.size
+	while pos + CHUNK_HEADER.size <= len(raw):
+		nrec, nword = CHUNK_HEADER.unpack_from(raw, pos)
+		pos += CHUNK_HEADER.size
+		end = pos + nrec*RECORD_DTYPE.itemsize + nword*WORD_DTYPE.itemsize
+		if end > len(raw): break # Ignore partially written final chunk
+		headers.append(raw[pos:pos + nrec*RECORD_DTYPE.itemsize].view(RECORD_DTYPE))
+		pos += nrec*RECORD_DTYPE.itemsize
+		words.append(raw[pos:end].view(WORD_DTYPE))
+		pos = end
+
+	headers = np.concatenate(headers) if headers else np.empty(0, dtype = RECORD_DTYPE)
+	words = np.concatenate(words) if words else np.empty(0, dtype = WORD_DTYPE)
+	offsets = np.zeros(len(headers), dtype = np.int64)
+	np.cumsum(headers["count"][:-1], out = offsets[1:])
+	return (start_tick, start_ns, headers, words, offsets)
+
+HEX = np.frombuffer(b'0123456789ABCDEF', dtype = np.uint8)
+NIBBLES_8 = np.arange(28, -1, -4, dtype = np.uint32)
+NIBBLES_2 = np.arange(4, -1, -4, dtype = np.uint32)
+MAX_WORDS = 16
+
+# Format unsigned integers as fixed width uppercase hex characters
+def hex_chars(values, nibbles):
+	return HEX[(values[..., None] >> nibbles) & 0xF]
+
+# Convert capture file to text layout produced by earlier firmware:
+# "TTTTTTTT, II, LL, NN, DDDDDDDD, ..." with tick relative to start of capture
+def export_text(binfilename, txtfilename, chunk = 65536):
+	start_tick, start_ns, headers, words, offsets = load(binfilename)
+	width = 20 + 10*MAX_WORDS + 1
+	cols = np.arange(width)
+	with open(txtfilename, 'wb') as fh:
+		for first in range(0, len(headers), chunk):
+			hdr = headers[first:first + chunk]
+			off = offsets[first:first + chunk]
+			count = hdr["count"].astype(np.intp)
+			n = len(hdr)
+			ticks = (hdr["tick"].astype(np.uint32) - np.uint32(start_tick)).astype(np.uint32)
+
+			# Fixed part of each line
+			out = np.full((n, width), ord(' '), dtype = np.uint8)
+			out[:, 0:8]   = hex_chars(ticks, NIBBLES_8)
+			out[:, 8]     = ord(',')
+			out[:, 10:12] = hex_chars(hdr["irq"].astype(np.uint32), NIBBLES_2)
+			out[:, 12]    = ord(',')
+			out[:, 14:16] = hex_chars(hdr["lsr"].astype(np.uint32), NIBBLES_2)
+			out[:, 16]    = ord(',')
+			out[:, 18:20] = hex_chars(count.astype(np.uint32), NIBBLES_2)
+
+			# Variable number of data words per line, padded out to maximum
+			slots = np.arange(MAX_WORDS)
+			valid = slots < count[:, None]
+			index = np.where(valid, off[:, None] + slots, 0)
+			padded = words[index].astype(np.uint32) if len(words) else np.zeros(index.shape, dtype = np.uint32)
+			body = out[:, 20:20 + 10*MAX_WORDS].reshape(n, MAX_WORDS, 10)
+			body[:, :, 0] = ord(',')
+			body[:, :, 2:] = hex_chars(padded, NIBBLES_8)
+
+			# Terminate each line after its last word and drop padding
+			end = 20 + 10*count
+			out[np.arange(n), end] = ord('\n')
+			fh.write(out[cols <= end[:, None]].tobytes())
+	return len(headers)
+
+if __name__ == "__main__":
+	if len(sys.argv) not in [2, 3]:
+		print("Usage: %s <capture.bin> [output.txt]" % sys.argv[0])
+		sys.exit(1)
+	txtfilename = sys.argv[2] if len(sys.argv) == 3 else 'data.txt'
+	print("Exporting '%s' to '%s' ..." % (sys.argv[1], txtfilename))
+	print("Exported %d records" % export_text(sys.argv[1], txtfilename))
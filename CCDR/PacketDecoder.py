@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import numpy as np
+import PacketCodec
+
+# Number of packets validated per pass over the memory map, bounding resident memory
+CHUNK_PACKETS = 65536
+
+# Memory-map a .pkt file or concatenated downlink dump of 256 byte packets
+# Return tuple of ((n, 256) uint8 read-only view, number of trailing bytes not forming a whole packet)
+def open_packets(filename):
+	size = os.path.getsize(filename)
+	n = size // PacketCodec.PACKET_BYTES
+	if n == 0: return (np.empty((0, PacketCodec.PACKET_BYTES), dtype = np.uint8), size)
+	mm = np.memmap(filename, dtype = np.uint8, mode = 'r', shape = (n, PacketCodec.PACKET_BYTES))
+	return (mm, size - n*PacketCodec.PACKET_BYTES)
+
+# Validate CRC32 of every packet in one pass, chunk by chunk
+# Return boolean mask of packets whose checksum matches
+def validate(packets, chunk = CHUNK_PACKETS):
+	valid = np.empty(len(packets), dtype = bool)
+	for first in range(0, len(packets), chunk):
+		block = packets[first:first + chunk]
+		stored = np.ascontiguousarray(block[:, PacketCodec.HEADER_BYTES + PacketCodec.BODY_BYTES:]).view('>u4').reshape(-1)
+		valid[first:first + chunk] = PacketCodec.crc32_packets(block) == stored
+	return valid
+
+# Decode packet file
+# Return tuple of (header structured array, (n, 60, 4) uint8 body view into the memory map,
+# CRC valid mask, number of trailing bytes)
+def load(filename):
+	packets, trailing = open_packets(filename)
+	headers = PacketCodec.unpack_headers(packets[:, :PacketCodec.HEADER_BYTES])
+	bodies = packets[:, PacketCodec.HEADER_BYTES:PacketCodec.HEADER_BYTES + PacketCodec.BODY_BYTES].reshape(-1, PacketCodec.SAMPLES_PER_PACKET, PacketCodec.CHANNELS)
+	valid = validate(packets)
+	return (headers, bodies, valid, trailing)
+
+# Format packet timestamp as UTC date
+def timestamp_text(timestamp):
+	ns = PacketCodec.LAUNCH_NS + int(timestamp)
+	return "%s.%09d UTC" % (time.strftime("%Y/%m/%d %H:%M:%S", time.gmtime(ns // 1000000000)), ns % 1000000000)
+
+def main(filename):
+	print("Decoding '%s' ..." % filename)
+	starttime = time.perf_counter()
+	headers, bodies, valid, trailing = load(filename)
+	elapsed = time.perf_counter() - starttime
+
+	print("Packets:         %d (%.3f s)" % (len(headers), elapsed))
+	print("Trailing bytes:  %d" % trailing)
+	print("CRC failures:    %d" % np.count_nonzero(~valid))
+	for i in np.flatnonzero(~valid)[:10]:
+		print("  Packet %d at offset 0x%X" % (i, i*PacketCodec.PACKET_BYTES))
+
+	good = headers[valid]
+	if len(good) == 0: return
+	for sysid in np.unique(good["sysid"]):
+		print("System %d:        %d packets" % (sysid, np.count_nonzero(good["sysid"] == sysid)))
+	print("First timestamp: %s" % timestamp_text(good["timestamp"].min()))
+	print("Last timestamp:  %s" % timestamp_text(good["timestamp"].max()))
+
+if __name__ == "__main__":
+	if len(sys.argv) != 2:
+		print("Usage: %s <packets.pkt>" % sys.argv[0])
+		sys.exit(1)
+	main(sys.argv[1])
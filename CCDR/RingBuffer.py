@@ -0,0 +1,150 @@
+import time
+import threading
+import numpy as np
+
+# Maximum number of bytes that can be drained from a 64 byte SC16IS750 RX FIFO
+RECORD_MAX_BYTES = 64
+
+# Fixed size record stored for every serviced interrupt
+#  tick  - pigpio tick at which the interrupt was detected
+#  irq   - masked IIR value (IIR[5:0])
+#  lsr   - LSR value read alongside IIR
+#  lvl   - RXLVL value read alongside IIR
+#  num   - number of valid bytes stored in data
+#  data  - RX FIFO bytes in the order they were received
+RECORD_DTYPE = np.dtype([
+	("tick", "<u4"),
+	("irq",  "u1"),
+	("lsr",  "u1"),
+	("lvl",  "u1"),
+	("num",  "u1"),
+	("data", "u1", (RECORD_MAX_BYTES,))
+])
+
+# Preallocated single producer, single consumer ring of fixed size records of any numpy dtype
+# Producer (pigpio callback thread) only advances head, consumer (flusher) only advances tail,
+# so no lock is needed as long as there is exactly one of each
+# Every field of dtype is also available as an attribute holding a view of that field
+class RingBuffer:
+	def __init__(self, dtype, capacity = 16384):
+		self.capacity = capacity
+		self.records = np.zeros(capacity, dtype = dtype)
+
+		# Keep direct views of each field so the ISR never builds record objects
+		self.fields = [self.records[name] for name in self.records.dtype.names]
+		for name, field in zip(self.records.dtype.names, self.fields): setattr(self, name, field)
+
+		# Monotonically increasing counters; slot index is counter modulo capacity
+		self.head = 0
+		self.tail = 0
+
+		# Largest number of records ever waiting to be flushed
+		self.highwater = 0
+		# Number of records discarded because the ring was full
+		self.dropped = 0
+
+	# Number of records waiting to be flushed
+	def __len__(self):
+		return self.head - self.tail
+
+	# Slot the next record is written to, or None if the ring is full and the record is dropped
+	def reserve(self):
+		if self.head - self.tail >= self.capacity:
+			self.dropped += 1
+			return None
+		return self.head % self.capacity
+
+	# Publish record written to reserved slot, only after all its fields have been written
+	def commit(self):
+		used = self.head + 1 - self.tail
+		self.head += 1
+		if used > self.highwater: self.highwater = used
+
+	# Store a single record given one value per field in dtype order, called from the ISR
+	# Return False if the ring is full and the record was dropped
+	def put(self, *values):
+		slot = self.reserve()
+		if slot is None: return False
+		for field, value in zip(self.fields, values): field[slot] = value
+		self.commit()
+		return True
+
+	# Pass all pending records to sink in at most two contiguous slices
+	# Return number of records drained
+	def drain(self, sink):
+		head = self.head
+		tail = self.tail
+		if head == tail: return 0
+
+		start = tail % self.capacity
+		end = start + (head - tail)
+		if end <= self.capacity:
+			sink(self.records[start:end])
+		else:
+			sink(self.records[start:])
+			sink(self.records[:end - self.capacity])
+
+		# Release slots only after sink is done with them
+		self.tail = head
+		return head - tail
+
+# Ring of RECORD_DTYPE interrupt records holding the bytes drained from an SC16IS750
+class InterruptRing(RingBuffer):
+	def __init__(self, capacity = 16384):
+		RingBuffer.__init__(self, RECORD_DTYPE, capacity)
+
+	# Store a single interrupt record, called from the ISR
+	# Return False if the ring is full and the record was dropped
+	def put(self, tick, irq, lsr, lvl, block):
+		slot = self.reserve()
+		if slot is None: return False
+
+		num = len(block)
+		self.tick[slot] = tick
+		self.irq[slot]  = irq
+		self.lsr[slot]  = lsr
+		self.lvl[slot]  = lvl
+		self.num[slot]  = num
+		if num: self.data[slot, :num] = np.frombuffer(block, dtype = np.uint8)
+		self.commit()
+		return True
+
+# Background thread draining a RingBuffer into a sink
+# Records are drained every interval seconds, or as soon as batch records are waiting when a batch is
+# given (checked every poll seconds), and flush (if given) is called after every drain that passed
+# records to sink
+class Flusher(threading.Thread):
+	def __init__(self, ring, sink, flush = None, interval = 0.5, batch = None, poll = 0.05):
+		threading.Thread.__init__(self, daemon = True)
+		self.ring = ring
+		self.sink = sink
+		self.flush = flush
+		self.interval = interval
+		self.batch = batch
+		self.poll = poll if batch else interval
+		self.stopped = threading.Event()
+
+		# Number of records written and drains performed
+		self.written = 0
+		self.drains = 0
+
+	def write(self):
+		n = self.ring.drain(self.sink)
+		if n == 0: return
+		if self.flush is not None: self.flush()
+		self.written += n
+		self.drains += 1
+
+	def run(self):
+		last = time.monotonic()
+		while not self.stopped.wait(self.poll):
+			if (self.batch and len(self.ring) >= self.batch) or time.monotonic() - last >= self.interval:
+				self.write()
+				last = time.monotonic()
+		# Catch anything stored between last drain and stop request
+		self.write()
+
+	# Stop thread and wait for final drain to complete
+	def stop(self):
+		self.stopped.set()
+		self.join()
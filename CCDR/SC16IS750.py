@@ -69,6 +69,7 @@ LCR_DATABITS_5     = 0x00 << 0
 LCR_DATABITS_6     = 0x01 << 0
 LCR_DATABITS_7     = 0x02 << 0
 LCR_DATABITS_8     = 0x03 << 0
+LCR_ENHANCED_SET   = 0xBF # Selects enhanced register set (EFR, XON1/2, XOFF1/2)
 
 # Section 8.5: Line Status Register (LSR)
 # LSR_FIFO_DATA_ERROR is valid for all data in FIFO
@@ -153,12 +154,16 @@ EFR_FLOW_CONTROL_RX_XON_XOFF_2 = 0x01 << 0
 # TCR[3:0] must be larger than TCR[7:4] (no hardware check to verify)
 # TCR[3:0] and TCR[7:4] define RX FIFO levels to halt and resume TX 
 # Each nybble represents a value from 0 to 60 bytes with granularity of 4 bytes
+TCR_HALT_SHIFT   = 0
+TCR_RESUME_SHIFT = 4
 
 # Section 8.14: Trigger Level Register (TLR)
 # TLR can only be set when EFR[4] = 1 and MCR[2] = 1
 # If TLR[7:4] or TLR[3:0] is zero, FCR sets associated trigger level
 # Each nybble represents a value from 4 to 60 bytes with granularity of 4 bytes
 # When TLR is used for RX trigger control, FCR[7:6] should be left unset
+TLR_TX_SHIFT = 0
+TLR_RX_SHIFT = 4
 
 # Section 8.15: Transmit FIFO Level Register (TXLVL)
 # Reports number of spaces available in TX FIFO from 0x00 (0) to 0x40 (64)
@@ -199,9 +204,14 @@ I2C_FLAGS   = 0x05 # Set I2C flags to LSB + (MSB << 8)
 I2C_READ    = 0x06 # Read P bytes of data
 I2C_WRITE   = 0x07 # Write P bytes of data
 
+# Registers mirrored by the shadow register cache (LCR, MCR, IER, FCR, EFR, DLL, DLH, SPR, TCR, TLR)
+# are tracked by name since the same subaddress selects different registers depending on LCR
+# FCR is write-only (reads return IIR) so it is never served from cache
+SHADOW_READABLE = ["LCR", "MCR", "IER", "EFR", "DLL", "DLH", "SPR", "TCR", "TLR"]
+
 class SC16IS750:
 
-	def __init__(self, pi, i2cbus = 1, i2caddr = 0x48, xtalfreq = 1843200, baudrate = 115200, databits = LCR_DATABITS_8, stopbits = LCR_STOPBITS_1, parity = LCR_PARITY_NONE):
+	def __init__(self, pi, i2cbus = 1, i2caddr = 0x48, xtalfreq = 1843200, baudrate = 115200, databits = LCR_DATABITS_8, stopbits = LCR_STOPBITS_1, parity = LCR_PARITY_NONE, verify = True):
 		self.pi = pi
 		self.i2c = pi.i2c_open(i2cbus, i2caddr)
 		self.xtalfreq = xtalfreq
@@ -210,6 +220,15 @@ class SC16IS750:
 		self.stopbits = stopbits
 		self.parity = parity
 
+		# Read back registers after writing them in byte_write_verify
+		self.verify = verify
+
+		# Write-through cache of configuration registers and I2C transaction counters
+		self.shadow = {}
+		self.transactions = 0
+		self.reads_avoided = 0
+		self.writes_avoided = 0
+
 		self.reset()
 		self.init_uart()
 
@@ -250,12 +269,40 @@ class SC16IS750:
 	def reset(self):
 		try: self.byte_write(REG_IOCONTROL, IOCONTROL_SOFTWARE_RESET)
 		except pigpio.error: pass
+		self.invalidate()
+
+	# Forget all cached register values, e.g. after the chip has been reset
+	def invalidate(self):
+		self.shadow = {}
+
+	# Number of I2C transactions saved by the shadow register cache
+	def transactions_avoided(self):
+		return self.reads_avoided + self.writes_avoided
+
+	# Name of cached register selected by subaddress under current register set
+	# Return None if register is not cached or register set is unknown
+	def shadow_name(self, reg):
+		if reg == REG_LCR: return "LCR"
+		lcr = self.shadow.get("LCR")
+		if lcr is None: return None
+		if lcr == LCR_ENHANCED_SET: return {REG_EFR: "EFR"}.get(reg)
+		if lcr & LCR_DIVISOR_ENABLE: return {REG_DLL: "DLL", REG_DLH: "DLH"}.get(reg)
+		if reg in [REG_TCR, REG_TLR]:
+			# MSR and SPR are replaced by TCR and TLR while MCR[2] and EFR[4] are set
+			mcr = self.shadow.get("MCR")
+			if mcr is None: return None
+			if not mcr & MCR_TCR_TLR: return "SPR" if reg == REG_SPR else None
+			efr = self.shadow.get("EFR")
+			if efr is None: return None
+			if not efr & EFR_ENHANCED_FUNCTIONS_ENABLE: return "SPR" if reg == REG_SPR else None
+			return "TCR" if reg == REG_TCR else "TLR"
+		return {REG_IER: "IER", REG_FCR: "FCR", REG_MCR: "MCR"}.get(reg)
 
 	# Write some test patterns to the scratchpad and verify receipt
 	def scratchpad_test(self):
-		t1b, t1v = self.byte_write_verify(REG_SPR, 0xFF)
-		t2b, t2v = self.byte_write_verify(REG_SPR, 0xAA)
-		t3b, t3v = self.byte_write_verify(REG_SPR, 0x00)
+		t1b, t1v = self.byte_write_verify(REG_SPR, 0xFF, True)
+		t2b, t2v = self.byte_write_verify(REG_SPR, 0xAA, True)
+		t3b, t3v = self.byte_write_verify(REG_SPR, 0x00, True)
 		return t1b and t2b and t3b
 
 	# Compute required divider values for DLH and DLL registers
@@ -271,12 +318,33 @@ class SC16IS750:
 	# Retreive interrupt status (IIR[5:0])
 	def get_interrupt_status(self):
 		# Read IIR, LSR, and RXLVL registers
+		self.transactions += 1
 		n, d = self.pi.i2c_zip(self.i2c, [I2C_WRITE, 1, self.reg_conv(REG_IIR), I2C_READ, 1, I2C_START, I2C_WRITE, 1, self.reg_conv(REG_LSR), I2C_READ, 1, I2C_START, I2C_WRITE, 1, self.reg_conv(REG_RXLVL), I2C_READ, 1, I2C_END])
 		if n < 0: raise pigpio.error(pigpio.error_text(n))
 		elif n != 3: raise ValueError("unexpected number of bytes received")
 		# Mask out two MSBs in IIR value and return tuple
 		return (int(d[0]) & 0x3F, int(d[1]), int(d[2]))
 
+	# Retreive interrupt status, then RX FIFO contents: two I2C transactions, or one if RXLVL holds
+	# fewer than mult bytes
+	# Only the whole multiples of mult among the RXLVL bytes just sampled are read; bytes keep arriving
+	# during the I2C reads, so RHR is never read beyond RXLVL and no byte popped from the FIFO is ever
+	# discarded. RHR cannot be read along with the status either, since an RX timeout interrupt leaves
+	# fewer bytes than the trigger level and reading an empty RHR returns stale data
+	# Bytes not forming a whole multiple of mult stay in the FIFO for the next read
+	# Return tuple of (IIR[5:0], LSR, RXLVL, bytearray of received bytes)
+	def read_status_and_fifo(self, mult = 1):
+		irq, lsr, lvl = self.get_interrupt_status()
+		whole = int(lvl/mult)*mult
+		if whole == 0: return (irq, lsr, lvl, bytearray())
+		return (irq, lsr, lvl, bytearray(self.block_read(REG_RHR, whole)))
+
+	# Reset TX and RX FIFOs, then write fcr to enable FIFOs
+	def reset_fifos(self, fcr = FCR_FIFO_ENABLE):
+		self.byte_write(REG_FCR, FCR_TX_FIFO_RESET | FCR_RX_FIFO_RESET)
+		time.sleep(2.0/self.xtalfreq)
+		self.byte_write(REG_FCR, fcr)
+
 	# Change single bit inside register
 	def enable_register_bit(self, reg, bit, enable):
 		if bit < 0 or bit > 7: return False
@@ -285,7 +353,7 @@ class SC16IS750:
 		oldvalue = self.byte_read(reg)
 		if enable: newvalue = oldvalue |  (0x01 << bit)
 		else:      newvalue = oldvalue & ~(0x01 << bit)
-		return self.byte_write_verify(REG_LCR, newvalue)
+		return self.byte_write_verify(reg, newvalue)
 
 	# MCR[4]: True for local loopback enable, False for disable
 	def enable_local_loopback(self, enable):
@@ -295,32 +363,122 @@ class SC16IS750:
 	def define_register_set(self, special):
 		return self.enable_register_bit(REG_LCR, 7, special)
 
-	# Write I2C byte to specified register and read it back
+	# Write register in enhanced register set (EFR, XON1/2, XOFF1/2) and restore LCR
+	# Return tuple indicating (boolean success, new value in register)
+	def enhanced_write_verify(self, reg, byte):
+		lcr = self.byte_read(REG_LCR)
+		s1, v1 = self.byte_write_verify(REG_LCR, LCR_ENHANCED_SET)
+		s2, v2 = self.byte_write_verify(reg, byte)
+		s3, v3 = self.byte_write_verify(REG_LCR, lcr)
+		return (s1 and s2 and s3, v2)
+
+	# Read register in enhanced register set (EFR, XON1/2, XOFF1/2) and restore LCR
+	def enhanced_read(self, reg):
+		lcr = self.byte_read(REG_LCR)
+		self.byte_write(REG_LCR, LCR_ENHANCED_SET)
+		value = self.byte_read(reg)
+		self.byte_write(REG_LCR, lcr)
+		return value
+
+	# EFR[4]: True to enable enhanced functions (IER[7:4], FCR[5:4], MCR[7:5], MCR[2], TCR, TLR)
+	def enable_enhanced_functions(self, enable):
+		efr = self.enhanced_read(REG_EFR)
+		if enable: efr |=  EFR_ENHANCED_FUNCTIONS_ENABLE
+		else:      efr &= ~EFR_ENHANCED_FUNCTIONS_ENABLE
+		return self.enhanced_write_verify(REG_EFR, efr)
+
+	# Write TCR or TLR, which are only accessible while EFR[4] and MCR[2] are set
+	# MCR[2] is cleared afterwards so MSR and SPR are accessible again
+	# Return tuple indicating (boolean success, new value in register)
+	def tcr_tlr_write_verify(self, reg, byte):
+		s1, v1 = self.enable_enhanced_functions(True)
+		s2, v2 = self.enable_register_bit(REG_MCR, 2, True)
+		s3, v3 = self.byte_write_verify(reg, byte)
+		s4, v4 = self.enable_register_bit(REG_MCR, 2, False)
+		return (s1 and s2 and s3 and s4, v3)
+
+	# Convert FIFO level in bytes to TCR/TLR nybble with 4 byte granularity
+	def fifo_nybble(self, level):
+		if level < 0 or level > 60 or level % 4 != 0:
+			raise ValueError("FIFO level must be a multiple of 4 from 0 to 60 bytes")
+		return level // 4
+
+	# Program RX and TX FIFO trigger levels through TLR with 4 byte granularity
+	# A level of zero leaves that trigger level to FCR; when setting the RX level here,
+	# FCR[7:6] should be left unset whenever FCR is written (see reset_fifos)
+	# Return tuple indicating (boolean success, new value in register)
+	def set_trigger_levels(self, rx, tx = 0):
+		tlr = (self.fifo_nybble(rx) << TLR_RX_SHIFT) | (self.fifo_nybble(tx) << TLR_TX_SHIFT)
+		return self.tcr_tlr_write_verify(REG_TLR, tlr)
+
+	# Configure hardware flow control: RTS is deasserted once RX FIFO reaches halt bytes and
+	# asserted again once it falls to resume bytes; CTS gates the transmitter
+	# Levels have 4 byte granularity and halt must be larger than resume
+	# Return tuple indicating (boolean success, new value in EFR)
+	def set_flow_control(self, halt = 56, resume = 16, rts = True, cts = True):
+		if halt <= resume: raise ValueError("halt level must be larger than resume level")
+		tcr = (self.fifo_nybble(halt) << TCR_HALT_SHIFT) | (self.fifo_nybble(resume) << TCR_RESUME_SHIFT)
+		s1, v1 = self.tcr_tlr_write_verify(REG_TCR, tcr)
+
+		efr = self.enhanced_read(REG_EFR) & ~(EFR_FLOW_CONTROL_RTS_ENABLE | EFR_FLOW_CONTROL_CTS_ENABLE)
+		if rts: efr |= EFR_FLOW_CONTROL_RTS_ENABLE
+		if cts: efr |= EFR_FLOW_CONTROL_CTS_ENABLE
+		s2, v2 = self.enhanced_write_verify(REG_EFR, efr)
+		return (s1 and s2, v2)
+
+	# Write I2C byte to specified register and read it back if verification is enabled
+	# Unverified writes report success with the written value
 	# Return tuple indicating (boolean success, new value in register)
-	def byte_write_verify(self, reg, byte):
+	def byte_write_verify(self, reg, byte, verify = None):
+		if verify is None: verify = self.verify
+		if not verify:
+			self.byte_write(reg, byte)
+			return (True, byte)
+
+		name = self.shadow_name(reg)
+		self.transactions += 1
 		n, d = self.pi.i2c_zip(self.i2c, [I2C_WRITE, 2, self.reg_conv(reg), byte, I2C_WRITE, 1, self.reg_conv(reg), I2C_READ, 1, I2C_END])
 		if n < 0: raise pigpio.error(pigpio.error_text(n))
 		elif n != 1: raise ValueError("unexpected number of bytes received")
 		d = int(d[0])
+		if name is not None: self.shadow[name] = d
 		return (d == byte, d)
 
 	# Write I2C byte to specified register
+	# Writes of cached registers already holding byte are skipped (FCR is always written)
 	def byte_write(self, reg, byte):
+		name = self.shadow_name(reg)
+		if name is not None and name != "FCR" and self.shadow.get(name) == byte:
+			self.writes_avoided += 1
+			return
+		self.transactions += 1
 		self.pi.i2c_write_byte_data(self.i2c, self.reg_conv(reg), byte)
+		if name == "FCR": byte &= ~(FCR_TX_FIFO_RESET | FCR_RX_FIFO_RESET)
+		if name is not None: self.shadow[name] = byte
 
-	# Read I2C byte from specified register
+	# Read I2C byte from specified register, using cached value if available
 	# Return byte received from driver
 	def byte_read(self, reg):
-		return self.pi.i2c_read_byte_data(self.i2c, self.reg_conv(reg))
+		name = self.shadow_name(reg)
+		if name in SHADOW_READABLE and name in self.shadow:
+			self.reads_avoided += 1
+			return self.shadow[name]
+		self.transactions += 1
+		byte = self.pi.i2c_read_byte_data(self.i2c, self.reg_conv(reg))
+		if name in SHADOW_READABLE: self.shadow[name] = byte
+		return byte
 
 	# Write I2C block to specified register
 	def block_write(self, reg, bytestring):
-		n, d = self.pi.i2c_zip(self.i2c, [I2C_WRITE, 1, self.reg_conv(reg), I2C_WRITE, len(bytestring)] + list(bytestring) + [I2C_END])
+		self.transactions += 1
+		# Register address and data must share one write, as every write segment begins with a (repeated) start
+		n, d = self.pi.i2c_zip(self.i2c, [I2C_WRITE, len(bytestring) + 1, self.reg_conv(reg)] + list(bytestring) + [I2C_END])
 		if n < 0: raise pigpio.error(pigpio.error_text(n))
 
 	# Read I2C block from specified register
 	# Return block received from driver
 	def block_read(self, reg, num):
+		self.transactions += 1
 		n, d = self.pi.i2c_zip(self.i2c, [I2C_WRITE, 1, self.reg_conv(reg), I2C_READ, num, I2C_END])
 		if n < 0: raise pigpio.error(pigpio.error_text(n))
 		elif n != num: raise ValueError("all available bytes were not successfully read")
@@ -0,0 +1,659 @@
+# In-process simulation of SC16IS750 I2C/UART bridges behind a fake pigpio interface
+#
+# SimulatedPi implements the subset of pigpio.pi used by this repository so that
+# SC16IS750.py and the CCDR firmware scripts can run on any machine. To run a script
+# unmodified, put the Simulator directory first on the module search path, e.g.
+#
+#   PYTHONPATH=Simulator python3 CCDRFirmwarePLP.py
+#
+# Each simulated chip models the 64 byte RX and TX FIFOs, FCR/TLR trigger levels, IIR
+# priorities, LSR overflow reporting, and the IRQ pin. Bytes arrive from a simulated
+# UART peer in real time, so FIFO overflows occur when the host services interrupts
+# too slowly, and bytes written to THR leave the TX FIFO at the line rate. Every I2C
+# byte advances simulated time by one byte time of the bus, and the FIFOs keep moving
+# between bytes, so data also arrives in the middle of a transaction as on hardware.
+# A summary of FIFO statistics is printed when the pi is stopped.
+
+import os
+import sys
+import time
+import threading
+
+# Simulation parameters, overridable through environment variables
+SIM_BAUD        = int(os.environ.get("SC16IS750SIM_BAUD", 115200))           # UART line rate of peers (8N1)
+SIM_PLP_PERIOD  = float(os.environ.get("SC16IS750SIM_PLP_PERIOD", 0.0014))   # Seconds between PLP samples (0 for line rate)
+SIM_I2C_CLOCK   = int(os.environ.get("SC16IS750SIM_I2C_CLOCK", 100000))      # I2C bus clock in Hz
+SIM_I2C_LATENCY = float(os.environ.get("SC16IS750SIM_I2C_LATENCY", 0.0002))  # Fixed cost of one pigpio socket command
+SIM_POLL        = float(os.environ.get("SC16IS750SIM_POLL", 0.0002))         # Event thread polling interval
+
+# pigpio compatible constants
+INPUT  = 0
+OUTPUT = 1
+ALT0   = 4
+ALT1   = 5
+ALT2   = 6
+ALT3   = 7
+ALT4   = 3
+ALT5   = 2
+
+PUD_OFF  = 0
+PUD_DOWN = 1
+PUD_UP   = 2
+
+RISING_EDGE  = 0
+FALLING_EDGE = 1
+EITHER_EDGE  = 2
+
+TIMEOUT = 2
+
+PI_I2C_WRITE_FAILED = -82
+PI_I2C_READ_FAILED  = -83
+PI_BAD_HANDLE       = -25
+
+ERRORS = {
+	PI_I2C_WRITE_FAILED: "i2c write failed",
+	PI_I2C_READ_FAILED:  "i2c read failed",
+	PI_BAD_HANDLE:       "unknown handle"
+}
+
+class error(Exception):
+	pass
+
+def error_text(errnum):
+	return ERRORS.get(errnum, "unknown error (%d)" % errnum)
+
+def tickDiff(t1, t2):
+	tDiff = t2 - t1
+	if tDiff < 0: tDiff += (1 << 32)
+	return tDiff
+
+# pigpio i2c_zip command bytes
+I2C_END     = 0x00
+I2C_ESCAPE  = 0x01
+I2C_START   = 0x02
+I2C_STOP    = 0x03
+I2C_ADDRESS = 0x04
+I2C_FLAGS   = 0x05
+I2C_READ    = 0x06
+I2C_WRITE   = 0x07
+
+# Register addresses (see SC16IS750.py)
+REG_RHR       = 0x00
+REG_IER       = 0x01
+REG_IIR       = 0x02
+REG_LCR       = 0x03
+REG_MCR       = 0x04
+REG_LSR       = 0x05
+REG_MSR       = 0x06
+REG_SPR       = 0x07
+REG_TXLVL     = 0x08
+REG_RXLVL     = 0x09
+REG_IODIR     = 0x0A
+REG_IOSTATE   = 0x0B
+REG_IOINTENA  = 0x0C
+REG_IOCONTROL = 0x0E
+REG_EFCR      = 0x0F
+
+FIFO_SIZE = 64
+
+# RX and TX trigger levels selected by FCR[7:6] and FCR[5:4]
+FCR_RX_TRIGGERS = [8, 16, 56, 60]
+FCR_TX_TRIGGERS = [8, 16, 32, 56]
+
+LSR_ERRORS = 0x1E
+
+IIR_NONE       = 0x01
+IIR_RX_ERROR   = 0x06
+IIR_RX_TIMEOUT = 0x0C
+IIR_RX_READY   = 0x04
+IIR_TX_READY   = 0x02
+
+# UART peer emulating LangmuirProbe/Emulator/Emulator.ino: once a byte with its MSB set
+# is received, a big-endian incrementing 32-bit counter is sent every period seconds
+class PLPPeer:
+	def __init__(self, pin_reset = 23, pin_enable = 27, period = SIM_PLP_PERIOD, baud = SIM_BAUD):
+		self.pin_reset = pin_reset
+		self.pin_enable = pin_enable
+		self.period = max(period, 40.0/baud)
+		self.science = False
+		self.data = 0
+		self.next = None
+
+	def receive(self, now, block, levels):
+		for byte in block:
+			self.science = bool(byte & 0x80)
+
+	def gpio_changed(self, gpio, level):
+		if gpio == self.pin_reset and level == 0:
+			self.data = 0
+			self.science = False
+
+	def poll(self, now, levels):
+		out = bytearray()
+		active = self.science and levels.get(self.pin_reset, 0) and levels.get(self.pin_enable, 0)
+		if not active:
+			self.next = None
+			return out
+		# Emulator waits 5 ms after entering science mode
+		if self.next is None: self.next = now + 0.005
+		while self.next <= now:
+			out += self.data.to_bytes(4, 'big')
+			self.data = (self.data + 1) & 0xFFFFFFFF
+			self.next += self.period
+		return out
+
+# UART peer echoing every received byte back after it has been transmitted on the line
+class EchoPeer:
+	def __init__(self, baud = SIM_BAUD):
+		self.bytetime = 10.0/baud
+		self.pending = []
+		self.free = 0.0
+
+	def receive(self, now, block, levels):
+		for byte in block:
+			self.free = max(self.free, now) + self.bytetime
+			self.pending.append((self.free, byte))
+
+	def gpio_changed(self, gpio, level):
+		pass
+
+	def poll(self, now, levels):
+		out = bytearray()
+		while self.pending and self.pending[0][0] <= now:
+			out.append(self.pending.pop(0)[1])
+		return out
+
+# Chips known to the simulation: I2C address -> (IRQ GPIO, peer factory)
+CHIPS = {
+	0x4C: (25, EchoPeer),
+	0x4D: ( 8, PLPPeer)
+}
+
+# Register level model of one SC16IS750
+class SC16IS750Chip:
+	def __init__(self, addr, irq_gpio, peer):
+		self.addr = addr
+		self.irq_gpio = irq_gpio
+		self.peer = peer
+		self.reset_registers()
+
+		# Statistics
+		self.bytes_arrived = 0
+		self.bytes_lost = 0
+		self.overflows = 0
+		self.max_rxlvl = 0
+		self.bytes_sent = 0
+		self.tx_lost = 0
+		self.transactions = 0
+
+	def reset_registers(self):
+		self.regs = {"IER": 0x00, "FCR": 0x00, "LCR": 0x1D, "MCR": 0x00, "SPR": 0xFF,
+			"DLL": 0x00, "DLH": 0x00, "EFR": 0x00, "TCR": 0x00, "TLR": 0x00,
+			"XON1": 0x00, "XON2": 0x00, "XOFF1": 0x00, "XOFF2": 0x00,
+			"IODIR": 0x00, "IOINTENA": 0x00, "IOCONTROL": 0x00, "EFCR": 0x00}
+		self.rx = bytearray()
+		self.lsr_errors = 0
+		self.last_rx = 0.0
+		self.tx_ready = False
+
+		# TX FIFO as list of (time byte finishes transmitting, byte) and time the line becomes idle
+		self.tx = []
+		self.tx_free = 0.0
+
+	def enhanced(self):
+		return bool(self.regs["EFR"] & 0x10)
+
+	def rx_trigger(self):
+		if self.enhanced() and self.regs["TLR"] >> 4:
+			return 4*(self.regs["TLR"] >> 4)
+		return FCR_RX_TRIGGERS[self.regs["FCR"] >> 6]
+
+	def tx_trigger(self):
+		if self.enhanced() and self.regs["TLR"] & 0x0F:
+			return 4*(self.regs["TLR"] & 0x0F)
+		return FCR_TX_TRIGGERS[(self.regs["FCR"] >> 4) & 0x03]
+
+	def capacity(self):
+		return FIFO_SIZE if self.regs["FCR"] & 0x01 else 1
+
+	# Name of register selected by subaddress under current LCR/MCR/EFR state
+	def decode(self, reg, write):
+		lcr = self.regs["LCR"]
+		if lcr == 0xBF and reg in [0x02, 0x04, 0x05, 0x06, 0x07]:
+			return {0x02: "EFR", 0x04: "XON1", 0x05: "XON2", 0x06: "XOFF1", 0x07: "XOFF2"}[reg]
+		if lcr & 0x80 and reg in [0x00, 0x01]:
+			return "DLL" if reg == 0x00 else "DLH"
+		tcrtlr = self.enhanced() and self.regs["MCR"] & 0x04
+		return {
+			0x00: "THR" if write else "RHR",
+			0x01: "IER",
+			0x02: "FCR" if write else "IIR",
+			0x03: "LCR",
+			0x04: "MCR",
+			0x05: "LSR",
+			0x06: "TCR" if tcrtlr else "MSR",
+			0x07: "TLR" if tcrtlr else "SPR",
+			0x08: "TXLVL",
+			0x09: "RXLVL",
+			0x0A: "IODIR",
+			0x0B: "IOSTATE",
+			0x0C: "IOINTENA",
+			0x0E: "IOCONTROL",
+			0x0F: "EFCR"
+		}.get(reg)
+
+	# Transmit bytes of TX FIFO whose time on the line has passed, then move bytes that have
+	# arrived from peer into RX FIFO
+	def advance(self, now, levels):
+		self.transmit(now, levels)
+		block = self.peer.poll(now, levels)
+		if not block: return
+		self.last_rx = max(self.last_rx, now)
+		if self.regs["EFCR"] & 0x02: return
+		self.bytes_arrived += len(block)
+		space = self.capacity() - len(self.rx)
+		if len(block) > space:
+			self.bytes_lost += len(block) - space
+			self.overflows += 1
+			self.lsr_errors |= 0x02
+			block = block[:space]
+		self.rx += block
+		if len(self.rx) > self.max_rxlvl: self.max_rxlvl = len(self.rx)
+
+	# Hand finished TX bytes to peer (or back to RX FIFO in loopback), raising TX ready once
+	# the space in the TX FIFO reaches the trigger level
+	def transmit(self, now, levels):
+		while self.tx and self.tx[0][0] <= now:
+			done, byte = self.tx.pop(0)
+			self.bytes_sent += 1
+			if self.regs["MCR"] & 0x10:
+				if len(self.rx) < self.capacity(): self.rx.append(byte)
+				self.last_rx = max(self.last_rx, done)
+			else:
+				self.peer.receive(done, [byte], levels)
+			if FIFO_SIZE - len(self.tx) == self.tx_trigger() or not self.tx:
+				if self.regs["IER"] & 0x02: self.tx_ready = True
+
+	# Queue byte written to THR behind bytes already waiting for the line
+	def queue_tx(self, byte, now):
+		if len(self.tx) >= self.capacity():
+			self.tx_lost += 1
+			return
+		self.tx_free = max(self.tx_free, now) + 10.0/SIM_BAUD
+		self.tx.append((self.tx_free, byte))
+
+	def iir(self, now):
+		ier = self.regs["IER"]
+		if ier & 0x04 and self.lsr_errors: irq = IIR_RX_ERROR
+		elif ier & 0x01 and len(self.rx) >= self.rx_trigger(): irq = IIR_RX_READY
+		elif ier & 0x01 and self.rx and now - self.last_rx >= 40.0/SIM_BAUD: irq = IIR_RX_TIMEOUT
+		elif ier & 0x02 and self.tx_ready: irq = IIR_TX_READY
+		else: irq = IIR_NONE
+		return irq
+
+	# IRQ pin is active low
+	def irq_level(self, now):
+		return 1 if self.iir(now) == IIR_NONE else 0
+
+	def read(self, reg, now):
+		name = self.decode(reg, False)
+		if name == "RHR":
+			if self.rx: return self.rx.pop(0)
+			return 0x00
+		elif name == "IIR":
+			irq = self.iir(now)
+			if irq == IIR_TX_READY: self.tx_ready = False
+			return irq | (0xC0 if self.regs["FCR"] & 0x01 else 0x00)
+		elif name == "LSR":
+			lsr = self.lsr_errors | (0x60 if not self.tx else 0x00)
+			if self.rx: lsr |= 0x01
+			if self.lsr_errors: lsr |= 0x80
+			self.lsr_errors = 0
+			return lsr
+		elif name == "MSR": return 0x00
+		elif name == "TXLVL": return FIFO_SIZE - len(self.tx)
+		elif name == "RXLVL": return len(self.rx)
+		elif name == "IOSTATE": return 0xFF
+		elif name == "FCR" or name is None: return 0x00
+		return self.regs[name]
+
+	# Return False if write is not acknowledged
+	def write(self, reg, byte, now, levels):
+		name = self.decode(reg, True)
+		if name == "THR":
+			# Writing THR clears the TX ready interrupt until the FIFO drains to the trigger level
+			self.queue_tx(byte, now)
+			self.tx_ready = False
+		elif name == "FCR":
+			if byte & 0x02:
+				self.rx = bytearray()
+				self.lsr_errors = 0
+			if byte & 0x04:
+				self.tx = []
+				self.tx_free = now
+			if not self.enhanced():
+				byte = (byte & ~0x30) | (self.regs["FCR"] & 0x30)
+			self.regs["FCR"] = byte & ~0x06
+			if byte & 0x04 and self.regs["IER"] & 0x02: self.tx_ready = True
+		elif name == "IER":
+			if not self.enhanced(): byte = (byte & 0x0F) | (self.regs["IER"] & 0xF0)
+			if byte & 0x02 and not self.regs["IER"] & 0x02: self.tx_ready = True
+			self.regs["IER"] = byte
+		elif name == "MCR":
+			if not self.enhanced(): byte = (byte & 0x1B) | (self.regs["MCR"] & 0xE4)
+			self.regs["MCR"] = byte
+		elif name == "IOCONTROL":
+			if byte & 0x08:
+				# Chip resets before acknowledging the write
+				self.reset_registers()
+				return False
+			self.regs["IOCONTROL"] = byte
+		elif name in self.regs:
+			self.regs[name] = byte
+		return True
+
+	def summary(self):
+		return "SC16IS750Sim 0x%02X: %d bytes arrived, %d bytes lost in %d overflows, max RXLVL %d, %d bytes sent, %d TX bytes lost, %d I2C transactions" % (self.addr, self.bytes_arrived, self.bytes_lost, self.overflows, self.max_rxlvl, self.bytes_sent, self.tx_lost, self.transactions)
+
+class _callback:
+	def __init__(self, pi, gpio, edge, func):
+		self.pi = pi
+		self.gpio = gpio
+		self.edge = edge
+		self.func = func if func is not None else self._tally
+		self.count = 0
+
+	def _tally(self, gpio, level, tick):
+		self.count += 1
+
+	# Like pigpio, waits for any callback being dispatched to return
+	def cancel(self):
+		with self.pi.dispatch:
+			if self in self.pi.callbacks: self.pi.callbacks.remove(self)
+
+	def tally(self):
+		return self.count
+
+	def reset_tally(self):
+		self.count = 0
+
+# Drop-in replacement for pigpio.pi backed by simulated SC16IS750 chips
+class SimulatedPi:
+	def __init__(self, host = None, port = None, show_errors = True):
+		self.connected = True
+		self.lock = threading.RLock()
+		self.dispatch = threading.RLock()
+		self.t0 = time.monotonic()
+		self.tick0 = int(time.time()*1e6) & 0xFFFFFFFF
+		self.modes = {}
+		self.levels = {}
+		self.pwm = {}
+		self.watchdogs = {}
+		self.lastedge = {}
+		self.callbacks = []
+		self.events = []
+		self.chips = {}
+		self.handles = {}
+		self.nexthandle = 0
+
+		# Simulated time at which the I2C bus becomes free; transactions queue behind each other
+		self.busy = 0.0
+
+		for addr, (gpio, peer) in CHIPS.items():
+			self.chips[addr] = SC16IS750Chip(addr, gpio, peer())
+			self.levels[gpio] = 1
+
+		self.running = True
+		self.thread = threading.Thread(target = self._run, daemon = True)
+		self.thread.start()
+
+	def _now(self):
+		return time.monotonic()
+
+	def _tick(self, now):
+		return (self.tick0 + int((now - self.t0)*1e6)) & 0xFFFFFFFF
+
+	def _set_level(self, gpio, level, now):
+		level = 1 if level else 0
+		if self.levels.get(gpio) == level: return
+		self.levels[gpio] = level
+		self.lastedge[gpio] = now
+		self.events.append((gpio, level, self._tick(now)))
+		for chip in self.chips.values():
+			chip.peer.gpio_changed(gpio, level)
+
+	def _advance(self, now):
+		for chip in self.chips.values():
+			chip.advance(now, self.levels)
+			self._set_level(chip.irq_gpio, chip.irq_level(now), now)
+
+	# Event thread delivering edges and watchdog timeouts to callbacks like pigpio's callback thread
+	def _run(self):
+		while self.running:
+			now = self._now()
+			with self.lock:
+				self._advance(now)
+				for gpio, (freq, duty, start) in self.pwm.items():
+					if freq <= 0: continue
+					phase = ((now - start)*freq) % 1.0
+					self._set_level(gpio, phase < duty/1e6, now)
+				for gpio, timeout in self.watchdogs.items():
+					if now - self.lastedge.get(gpio, self.t0) >= timeout:
+						self.lastedge[gpio] = now
+						self.events.append((gpio, TIMEOUT, self._tick(now)))
+				events = self.events
+				self.events = []
+			with self.dispatch:
+				for gpio, level, tick in events:
+					for cb in list(self.callbacks):
+						if cb.gpio != gpio: continue
+						if level == TIMEOUT or cb.edge == EITHER_EDGE or (cb.edge == RISING_EDGE) == (level == 1):
+							cb.func(gpio, level, tick)
+			time.sleep(SIM_POLL)
+
+	# Simulated time at which the first byte of a new I2C transaction starts, after the fixed cost
+	# of the pigpio command and any transaction still on the bus
+	def _i2c_begin(self):
+		return max(self._now(), self.busy) + SIM_I2C_LATENCY
+
+	# Advance simulated time by one I2C byte (8 bits and acknowledge), moving every FIFO meanwhile
+	def _i2c_byte(self, t):
+		t += 9.0/SIM_I2C_CLOCK
+		self._advance(t)
+		return t
+
+	# Mark bus busy until t (after the stop condition) and return it
+	def _i2c_end(self, t):
+		t += 9.0/SIM_I2C_CLOCK
+		self.busy = t
+		return t
+
+	# Wait outside the lock until wall time catches up with the end of a transaction
+	def _i2c_wait(self, t):
+		delay = t - self._now()
+		if delay > 0: time.sleep(delay)
+
+	def _chip(self, handle):
+		if handle not in self.handles: raise error(error_text(PI_BAD_HANDLE))
+		chip = self.chips.get(self.handles[handle])
+		if chip is None: raise error(error_text(PI_I2C_WRITE_FAILED))
+		chip.transactions += 1
+		return chip
+
+	def stop(self):
+		self.running = False
+		self.thread.join()
+		for chip in self.chips.values():
+			if chip.bytes_arrived or chip.transactions:
+				sys.stderr.write(chip.summary() + "\n")
+		self.connected = False
+
+	def get_current_tick(self):
+		return self._tick(self._now())
+
+	def set_mode(self, gpio, mode):
+		with self.lock:
+			self.modes[gpio] = mode
+		return 0
+
+	def get_mode(self, gpio):
+		return self.modes.get(gpio, INPUT)
+
+	def set_pull_up_down(self, gpio, pud):
+		with self.lock:
+			if gpio not in self.levels: self.levels[gpio] = 1 if pud == PUD_UP else 0
+		return 0
+
+	def read(self, gpio):
+		with self.lock:
+			self._advance(self._now())
+			return self.levels.get(gpio, 0)
+
+	def write(self, gpio, level):
+		with self.lock:
+			self._set_level(gpio, level, self._now())
+		return 0
+
+	def set_bank_1(self, bits):
+		with self.lock:
+			now = self._now()
+			for gpio in range(32):
+				if bits & (1 << gpio): self._set_level(gpio, 1, now)
+		return 0
+
+	def clear_bank_1(self, bits):
+		with self.lock:
+			now = self._now()
+			for gpio in range(32):
+				if bits & (1 << gpio): self._set_level(gpio, 0, now)
+		return 0
+
+	def read_bank_1(self):
+		with self.lock:
+			return sum(1 << g for g, l in self.levels.items() if l and g < 32)
+
+	def gpio_trigger(self, user_gpio, pulse_len = 10, level = 1):
+		with self.lock:
+			now = self._now()
+			self._set_level(user_gpio, level, now)
+			self._set_level(user_gpio, 1 - level, now + pulse_len*1e-6)
+		return 0
+
+	def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+		with self.lock:
+			self.pwm[gpio] = (PWMfreq, PWMduty, self._now())
+		return 0
+
+	def set_watchdog(self, user_gpio, wdog_timeout):
+		with self.lock:
+			if wdog_timeout:
+				self.watchdogs[user_gpio] = wdog_timeout/1000.0
+				self.lastedge[user_gpio] = self._now()
+			else: self.watchdogs.pop(user_gpio, None)
+		return 0
+
+	def callback(self, user_gpio, edge = RISING_EDGE, func = None):
+		cb = _callback(self, user_gpio, edge, func)
+		with self.dispatch:
+			self.callbacks.append(cb)
+		return cb
+
+	def i2c_open(self, i2c_bus, i2c_address, i2c_flags = 0):
+		with self.lock:
+			handle = self.nexthandle
+			self.nexthandle += 1
+			self.handles[handle] = i2c_address
+		return handle
+
+	def i2c_close(self, handle):
+		with self.lock:
+			if self.handles.pop(handle, None) is None: raise error(error_text(PI_BAD_HANDLE))
+		return 0
+
+	# SMBus quick write only acknowledges at addresses of simulated chips
+	def i2c_write_quick(self, handle, bit):
+		with self.lock:
+			self._chip(handle)
+			t = self._i2c_end(self._i2c_byte(self._i2c_begin()))
+		self._i2c_wait(t)
+		return 0
+
+	def i2c_write_byte_data(self, handle, reg, byte_val):
+		with self.lock:
+			chip = self._chip(handle)
+			t = self._i2c_byte(self._i2c_byte(self._i2c_begin()))
+			t = self._i2c_byte(t)
+			ack = chip.write((reg >> 3) & 0x0F, byte_val, t, self.levels)
+			t = self._i2c_end(t)
+		self._i2c_wait(t)
+		if not ack: raise error(error_text(PI_I2C_WRITE_FAILED))
+		return 0
+
+	def i2c_read_byte_data(self, handle, reg):
+		with self.lock:
+			chip = self._chip(handle)
+			t = self._i2c_byte(self._i2c_byte(self._i2c_begin()))
+			t = self._i2c_byte(self._i2c_byte(t))
+			value = chip.read((reg >> 3) & 0x0F, t)
+			t = self._i2c_end(t)
+		self._i2c_wait(t)
+		return value
+
+	# Execute list of pigpio I2C commands against one chip
+	# Every address and data byte takes one I2C byte time, and FIFOs and peers advance between
+	# bytes, so RX data keeps arriving while a long read is in progress
+	def i2c_zip(self, handle, data):
+		out = bytearray()
+		ack = True
+		with self.lock:
+			chip = self._chip(handle)
+			t = self._i2c_begin()
+			self._advance(t)
+			reg = 0
+			i = 0
+			while i < len(data) and data[i] != I2C_END:
+				cmd = data[i]
+				i += 1
+				if cmd == I2C_ESCAPE:
+					cmd = data[i]
+					i += 1
+					count = data[i] | (data[i+1] << 8)
+					i += 2
+				elif cmd in [I2C_ADDRESS, I2C_READ, I2C_WRITE]:
+					count = data[i]
+					i += 1
+				elif cmd == I2C_FLAGS:
+					i += 2
+					continue
+				else: continue
+
+				if cmd == I2C_ADDRESS:
+					if count != chip.addr: chip = self.chips.get(count)
+				elif cmd == I2C_WRITE:
+					block = data[i:i+count]
+					i += count
+					t = self._i2c_byte(t)
+					if chip is None:
+						ack = False
+						break
+					t = self._i2c_byte(t)
+					reg = (block[0] >> 3) & 0x0F
+					for byte in block[1:]:
+						t = self._i2c_byte(t)
+						ack = chip.write(reg, byte, t, self.levels) and ack
+				elif cmd == I2C_READ:
+					t = self._i2c_byte(t)
+					if chip is None:
+						ack = False
+						break
+					for j in range(count):
+						t = self._i2c_byte(t)
+						out.append(chip.read(reg, t))
+			t = self._i2c_end(t)
+			self._advance(t)
+		self._i2c_wait(t)
+		if not ack: raise error(error_text(PI_I2C_WRITE_FAILED))
+		return len(out), out
+
+# pigpio style constructor name
+pi = SimulatedPi
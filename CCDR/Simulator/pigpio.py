@@ -0,0 +1,9 @@
+# Stand-in for the pigpio module backed by SC16IS750Sim.py
+# Usage from the CCDR directory: PYTHONPATH=Simulator python3 CCDRFirmwarePLP.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SC16IS750Sim import *
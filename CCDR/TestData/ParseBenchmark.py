@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import CCDRParsePLP
+
+# Number of interrupt lines to generate (56 byte trigger gives 14 samples per line)
+lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+# Generate data in the format saved by CCDRFirmwarePLP.py while reading from
+# an Arduino flashed with LangmuirProbe/Emulator/Emulator.ino (incrementing counter)
+def generate(filename, lines):
+	random.seed(0)
+	tick = 0
+	counter = 0
+	with open(filename, 'w') as fh:
+		for i in range(lines):
+			tick += random.randint(0x500, 0x700)
+			r = random.random()
+			if r < 0.001:
+				# RX overflow drops data and resets FIFO
+				fh.write("%08X, %02X, %02X, %02X\n" % (tick, 0x06, 0xE3, 0))
+				counter += random.randint(1, 16)
+				continue
+			elif r < 0.002:
+				# Samples silently lost without an RX error
+				counter += random.randint(1, 4)
+			if r < 0.1: irq, n = 0x0C, random.randint(1, 13)
+			else: irq, n = 0x04, 14
+			fh.write("%08X, %02X, %02X, %02X" % (tick, irq, 0x61, n))
+			for j in range(n):
+				fh.write(", %08X" % counter)
+				counter += 1
+			fh.write("\n")
+
+# Line by line parser and per-element checks used by CCDRParsePLP.py before vectorization
+def legacy(filename):
+	T = []
+	I = []
+	L = []
+	N = []
+	D = []
+	mismatch = 0
+	with open(filename, 'r') as f:
+		for line in f:
+			values = line.split(', ')
+			t = int(values[0], 16)
+			i = int(values[1], 16)
+			l = int(values[2], 16)
+			n = int(values[3], 16)
+			if n != len(values) - 4:
+				mismatch += 1
+			if n == 0:
+				T.append(t)
+				I.append(i)
+				L.append(l)
+				N.append(n)
+				D.append(None)
+			else:
+				T.extend([int(values[0], 16)]*n)
+				I.extend([int(values[1], 16)]*n)
+				L.extend([int(values[2], 16)]*n)
+				N.extend([int(values[3], 16)]*n)
+				d = []
+				for i in range(4, len(values)):
+					d.append(int(values[i], 16))
+				D.extend(d)
+
+	overflows = 0
+	discontin = 0
+	for i in range(len(T)):
+		if I[i] == 0x06:
+			overflows += 1
+		if i > 0:
+			if D[i] is None or D[i-1] is None: pass
+			elif (D[i] - D[i-1]) != 1:
+				discontin += 1
+	return (mismatch, overflows, discontin)
+
+def vectorized(filename):
+	T, I, L, N, D, valid, mismatch = CCDRParsePLP.load(filename)
+	rxerror, unexpected, discontinuity, missed, gaps = CCDRParsePLP.analyze(I, D, valid)
+	return (len(mismatch), int(rxerror.sum()), int(discontinuity.sum()))
+
+fd, filename = tempfile.mkstemp(suffix = '.txt')
+os.close(fd)
+try:
+	sys.stdout.write("Generating %d lines of synthetic emulator data ... " % lines)
+	sys.stdout.flush()
+	generate(filename, lines)
+	print("done! (%.1f MiB)" % (os.path.getsize(filename)/1024.0/1024.0))
+
+	results = {}
+	for name, func in [("Legacy", legacy), ("Vectorized", vectorized)]:
+		starttime = time.perf_counter()
+		results[name] = func(filename)
+		elapsed = time.perf_counter() - starttime
+		print("%-10s %8.3f s  (mismatch: %d, receive errors: %d, discontinuities: %d)" % ((name, elapsed) + results[name]))
+
+	if results["Legacy"] != results["Vectorized"]:
+		print("RESULTS DIFFER!")
+		sys.exit(1)
+finally:
+	os.remove(filename)
@@ -1,39 +1,21 @@
-import os, glob
+import os, sys, glob
 import matplotlib.pyplot as plt
+import ElectrometerFile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Plotting'))
+import DecimatedPlot
 
-T1 = []
-C1 = []
-T2 = []
-C2 = []
-T3 = []
-C3 = []
-T4 = []
-C4 = []
+# Return list of (name, microseconds since start, volts) for every channel in file
+def load_channels(filename):
+	pga, dr, config, start_tick, start_ns, channels = ElectrometerFile.load(filename)
+	return [("Channel %d" % (c + 1), channels[c][0], channels[c][1]) for c in sorted(channels)]
 
-filename = max(glob.glob('data/*'), key=os.path.getctime)
-with open(filename, 'r') as f:
-	for line in f:
-		t, c, vr, vc = line.split(', ')
-		if c == '0':
-			T1.append(float(t))
-			C1.append(float(vc))
-		elif c == '1':
-			T2.append(float(t))
-			C2.append(float(vc))
-		elif c == '2':
-			T3.append(float(t))
-			C3.append(float(vc))
-		elif c == '3':
-			T4.append(float(t))
-			C4.append(float(vc))
+filename = max(glob.glob('data/*.bin'), key=os.path.getctime)
+data = DecimatedPlot.DecimatedPlot(filename, load_channels)
 
 plt.figure(1)
 plt.title("Electrometer Data")
 plt.xlabel("Time (us)")
 plt.ylabel("Voltage (V)")
-plt.plot(T1, C1, label="Channel 1")
-plt.plot(T2, C2, label="Channel 2")
-plt.plot(T3, C3, label="Channel 3")
-plt.plot(T4, C4, label="Channel 4")
+data.plot(plt.gca())
 plt.legend()
 plt.savefig('data.png', dpi=200)
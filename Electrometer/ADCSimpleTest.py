@@ -1,6 +1,8 @@
 import sys
 import time
 import smbus
+import numpy as np
+import ElectrometerCodec
 
 # Primary ADC with address 0x48, secondary ADC with address 0x49
 # Addresses 0x48 (GND), 0x49 (VDD), 0x4A (SDA), 0x4B (SCL)
@@ -88,17 +90,14 @@ while True:
 
 		# Wait for conversion to complete and read in results:
 		time.sleep(1/860.0+0.001)
-		for address in [0x48, 0x49]:
-			datatc = bus.read_word_data(address, REG_CONV)
+		raw = [bus.read_word_data(address, REG_CONV) for address in [0x48, 0x49]]
 
-			# Swap order of bytes and convert out of two byte two's complement to integer length two's complement:
-			datatc = ((datatc & 0xFF00) >> 8) | ((datatc & 0x00FF) << 8)
-			data = -(datatc & 0x8000) | (datatc & 0x7FFF)
+		# Swap order of bytes and convert out of two byte two's complement for both chips at once:
+		codes, volts = ElectrometerCodec.decode(raw, CONF_PGA)
 
-			# Print received data bytes and processed ADC values to stdout:
-			# At 4.096 V PGA setting, one bin has a value of 125 uV (4.096/0x7FFF), so fourth decimal place is uncertain.
-			# Since the ADC saves space for negative values as well, the single ended range is only 15 bits (therefore 0x7FFF bins).
-			sys.stdout.write(', Data (0x{0:02X}): 0x{1:04X} ({2:+.4f} V)'.format(address, datatc, data*4.096/0x7FFF))
+		# Print received data bytes and processed ADC values to stdout:
+		for address, code, value in zip([0x48, 0x49], codes.view(np.uint16).tolist(), volts.tolist()):
+			sys.stdout.write(', Data (0x{0:02X}): 0x{1:04X} ({2:+.4f} V)'.format(address, code, value))
 		sys.stdout.write('\n')
 
 	# Initialize new readings at a frequency of 10 Hz:
@@ -1,7 +1,13 @@
+import os
 import sys
 import time
 import smbus
 import threading
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CCDR'))
+import RingBuffer
+import ElectrometerFile
+import ElectrometerCodec
 
 # Primary ADC with address 0x48, secondary ADC with address 0x49
 # Addresses 0x48 (GND), 0x49 (VDD), 0x4A (SDA), 0x4B (SCL)
@@ -63,65 +69,84 @@ CONF_COMP_LAT = 0x00 # 0b0
 # CONF_COMP_QUE: 0b00 After 1, 0b01 After 2, 0b10 After 4, 0b11 Disabled
 CONF_COMP_QUE = 0x03 # 0b11
 
-# Store program start time as zero point for measurements:
-inittime = time.time()
-
-dataready = False
-databuffer = {'time': 0, 'config': [], 'C0': [], 'C1': [], 'C2': [], 'C3': []}
-
-def sample():
-	# Initialize countdown to next sample:
-	threading.Timer(0.1, sample).start()
-
-	# Declare global storage variables:
-	global dataready, databuffer
-
-	# Record current sample time:
-	databuffer['time'] = time.time() - inittime
+# Sampling period and time allowed for each single-shot conversion (s)
+PERIOD = 0.1
+CONVERSION_TIME = 1/860.0+0.001
 
-	# Cycle through each of the four ADC input channels in series:
-	for channel in range(4):
-		# Generate bits to connect multiplexer to correct channel and generate configuration bytes:
-		CONF_MUX = (1 << 2) | channel # 0b1XX
-		config = [(CONF_OS << 7) | (CONF_MUX << 4) | (CONF_PGA << 1) | CONF_MODE, (CONF_DR << 5) | (CONF_COMP_MODE << 4) | (CONF_COMP_POL << 3) | (CONF_COMP_LAT << 2) | CONF_COMP_QUE]
+# Store program start time as zero point for measurements:
+inittime = time.monotonic()
 
-		# Concatenate both configuration bytes and store value in buffer:
-		databuffer['config'].append('0x{0:04X}'.format((config[0] << 8) | config[1]))
+# Preallocated queue between sampling thread and main loop
+queue = RingBuffer.RingBuffer(ElectrometerFile.SAMPLE_DTYPE, 4096)
 
-		# Alternate between two ADC chips on I2C bus:
-		for address in addresses:
-			# Write configuration bytes to chip, wait for conversion to take place, and read in conversion bytes:
-			bus.write_i2c_block_data(address, REG_CONF, config)
+# Number of periods whose sampling finished after the next deadline, and periods skipped as a result
+overruns = 0
+skipped = 0
 
-		# Wait for conversion to complete and read in results:
-		time.sleep(1/860.0+0.001)
-		for address in addresses:
-			datatc = bus.read_word_data(address, REG_CONV)
+# Sleep until absolute time on monotonic clock
+def sleep_until(deadline):
+	delay = deadline - time.monotonic()
+	if delay > 0: time.sleep(delay)
 
-			# Swap order of bytes and convert out of two byte two's complement to integer length two's complement:
-			datatc = ((datatc & 0xFF00) >> 8) | ((datatc & 0x00FF) << 8)
-			data = -(datatc & 0x8000) | (datatc & 0x7FFF)
+# Start single-shot conversion of channel on both chips and return time conversion started
+def configure(channel):
+	# Generate bits to connect multiplexer to correct channel and generate configuration bytes:
+	CONF_MUX = (1 << 2) | channel # 0b1XX
+	config = [(CONF_OS << 7) | (CONF_MUX << 4) | (CONF_PGA << 1) | CONF_MODE, (CONF_DR << 5) | (CONF_COMP_MODE << 4) | (CONF_COMP_POL << 3) | (CONF_COMP_LAT << 2) | CONF_COMP_QUE]
 
-			# Store received data bytes and processed ADC values in buffer:
-			# At 4.096 V PGA setting, one bin has a value of 125 uV (4.096/0x7FFF), so fourth decimal place is uncertain.
-			# Since the ADC saves space for negative values as well, the single ended range is only 15 bits (therefore 0x7FFF bins).
-			databuffer['C' + str(channel)].append('(0x{0:02X}): 0x{1:04X} ({2:+.4f} V)'.format(address, datatc, data*4.096/0x7FFF))
+	started = time.monotonic()
+	# Alternate between two ADC chips on I2C bus:
+	for address in addresses:
+		bus.write_i2c_block_data(address, REG_CONF, config)
+	return started
 
-	dataready = True
+def sample():
+	started = configure(0)
 
-sample()
+	# Cycle through each of the four ADC input channels in series:
+	for channel in range(4):
+		# Record time conversion started in microseconds:
+		tick = int((started - inittime)*1e6) & 0xFFFFFFFF
+
+		# Wait for conversion to complete:
+		sleep_until(started + CONVERSION_TIME)
+
+		# Read in results before starting conversion of next channel, which would otherwise
+		# race the reads for the conversion register:
+		for chip, address in enumerate(addresses):
+			queue.put(tick, chip, channel, bus.read_word_data(address, REG_CONV))
+		if channel < 3: started = configure(channel + 1)
+
+# Persistent sampling thread scheduling every period from absolute deadlines, so timing
+# errors never accumulate and the cadence stays phase locked to inittime
+def sample_loop():
+	global overruns, skipped
+	period = 0
+	while True:
+		sleep_until(inittime + period*PERIOD)
+		sample()
+		period += 1
+
+		# Skip deadlines that have already passed instead of sampling in a burst to catch up
+		current = int((time.monotonic() - inittime)/PERIOD)
+		if current >= period:
+			overruns += 1
+			skipped += current - period + 1
+			period = current + 1
+
+# Print batch of samples drained from queue
+def print_samples(records):
+	# Convert whole batch of received data bytes to signed codes and volts at once
+	codes, volts = ElectrometerCodec.decode(records["raw"], CONF_PGA)
+	for tick, chip, channel, code, value in zip(records["tick"].tolist(), records["chip"].tolist(), records["channel"].tolist(), codes.view(np.uint16).tolist(), volts.tolist()):
+		sys.stdout.write('Time: {0:.4f} s, Channel: {1:d}, Data (0x{2:02X}): 0x{3:04X} ({4:+.4f} V)\n'.format(tick/1e6, channel, addresses[chip], code, value))
+
+threading.Thread(target = sample_loop, daemon = True).start()
 
 while True:
-	time.sleep(0.01)
-	if dataready:
-		dataparse = databuffer
-		databuffer = {'time': 0, 'addr': [], 'config': [], 'C0': [], 'C1': [], 'C2': [], 'C3': []}
-		dataready = False
-
-		sys.stdout.write('Time: {0:.2f} s\n'.format(dataparse['time']))
-		for channel in range(4):
-			sys.stdout.write('  Channel: ' + str(channel))
-			sys.stdout.write(', Config: ' + dataparse['config'][channel])
-			for data in dataparse['C' + str(channel)]:
-				sys.stdout.write(', Data ' + data)
-			sys.stdout.write('\n')
+	try:
+		time.sleep(0.1)
+		queue.drain(print_samples)
+		if overruns or queue.dropped:
+			sys.stdout.write('Period overruns: {0:d} ({1:d} periods skipped), queue overruns: {2:d}\n'.format(overruns, skipped, queue.dropped))
+	except KeyboardInterrupt: break
@@ -0,0 +1,22 @@
+import numpy as np
+
+# Full scale range in volts for every PGA setting (CONF_PGA)
+PGA_FSR = [6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256]
+
+# Convert raw conversion register values as returned by smbus read_word_data into signed codes
+# smbus reads the big-endian register little-endian, so swap order of bytes and reinterpret
+# as two byte two's complement; accepts scalars or arrays of any shape
+def decode_raw(raw):
+	raw = np.asarray(raw, dtype = np.uint16)
+	return ((raw >> 8) | (raw << 8)).view(np.int16)
+
+# Convert signed codes into volts for PGA setting
+# Since the ADC saves space for negative values as well, the single ended range is only 15 bits
+# (therefore 0x7FFF bins); at 4.096 V PGA setting one bin is 125 uV
+def to_volts(codes, pga):
+	return np.asarray(codes, dtype = np.int16)*(PGA_FSR[pga]/0x7FFF)
+
+# Convert raw conversion register values into tuple of (signed codes, volts)
+def decode(raw, pga):
+	codes = decode_raw(raw)
+	return (codes, to_volts(codes, pga))
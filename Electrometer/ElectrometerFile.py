@@ -0,0 +1,128 @@
+import sys
+import time
+import struct
+import numpy as np
+import ElectrometerCodec
+
+### ELECTROMETER BINARY FILE FORMAT ###
+#
+#  ######## 24 BYTE HEADER ########
+#  #  4 bytes - Magic ('ELEC')
+#  #  1 byte  - Format version
+#  #  1 byte  - PGA setting (CONF_PGA)
+#  #  1 byte  - Data rate setting (CONF_DR)
+#  #  1 byte  - Unused
+#  #  2 bytes - Configuration register of first channel
+#  #  2 bytes - Unused
+#  #  4 bytes - pigpio tick at start of capture
+#  #  8 bytes - Host time at start of capture (integer number of nanoseconds)
+#  ###############################
+#
+#  ####### 7 BYTE RECORD (REPEATED) #######
+#  #  4 bytes - pigpio tick of conversion ready edge
+#  #  1 byte  - Channel (chip*4 + ADC input)
+#  #  2 bytes - Conversion result (two's complement)
+#  ########################################
+#
+# All values are little-endian. Records are appended as they are written, so a file is
+# valid up to the last complete record even if capture is interrupted.
+#
+#######################################
+
+MAGIC = b'ELEC'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sBBBxH2xIq')
+
+RECORD_DTYPE = np.dtype([
+	("tick",    "<u4"),
+	("channel", "u1"),
+	("code",    "<i2")
+])
+
+# Sample queued by the ADC callbacks in a RingBuffer for every conversion, before conversion to RECORD_DTYPE
+#  tick     - pigpio tick of ALERT/RDY falling edge
+#  chip     - index of ADC (0 primary, 1 secondary)
+#  channel  - ADC input channel
+#  raw      - conversion register as returned by smbus read_word_data (bytes swapped)
+SAMPLE_DTYPE = np.dtype([
+	("tick",    "<u4"),
+	("chip",    "u1"),
+	("channel", "u1"),
+	("raw",     "<u2")
+])
+
+# Number of input channels on each ADC
+CHANNELS_PER_CHIP = 4
+
+# Append-only writer fed with RingBuffer slices of SAMPLE_DTYPE samples
+class ElectrometerFileWriter:
+	def __init__(self, filename, pga, dr, config, start_tick, start_ns = None):
+		if start_ns is None: start_ns = time.time_ns()
+		self.fh = open(filename, 'wb')
+		self.fh.write(FILE_HEADER.pack(MAGIC, VERSION, pga, dr, config, start_tick & 0xFFFFFFFF, start_ns))
+		self.records = 0
+
+	# Append a slice of SAMPLE_DTYPE samples
+	def write(self, samples):
+		n = len(samples)
+		if n == 0: return
+		records = np.empty(n, dtype = RECORD_DTYPE)
+		records["tick"] = samples["tick"]
+		records["channel"] = samples["chip"]*CHANNELS_PER_CHIP + samples["channel"]
+		records["code"] = ElectrometerCodec.decode_raw(samples["raw"])
+
+		self.fh.write(records.tobytes())
+		self.records += n
+
+	def flush(self):
+		self.fh.flush()
+
+	def close(self):
+		self.fh.close()
+
+# Load file written by ElectrometerFileWriter
+# Return tuple of (PGA, data rate, config, start tick, start ns, dictionary mapping every channel
+# to tuple of (microseconds since start tick, volts))
+def load(filename):
+	with open(filename, 'rb') as fh:
+		header = fh.read(FILE_HEADER.size)
+	if len(header) < FILE_HEADER.size:
+		raise ValueError("file too short to contain header")
+	magic, version, pga, dr, config, start_tick, start_ns = FILE_HEADER.unpack(header)
+	if magic != MAGIC: raise ValueError("not an electrometer data file")
+	if version != VERSION: raise ValueError("unsupported electrometer file version %d" % version)
+
+	# Map whole records only, ignoring partially written final record
+	records = np.fromfile(filename, dtype = RECORD_DTYPE, offset = FILE_HEADER.size)
+
+	# Unwrap 32 bit ticks into microseconds since start of capture
+	ticks = records["tick"]
+	elapsed = np.empty(len(ticks), dtype = np.int64)
+	if len(ticks):
+		elapsed[0] = (int(ticks[0]) - start_tick) & 0xFFFFFFFF
+		np.cumsum(np.diff(ticks).astype(np.uint32), out = elapsed[1:])
+		elapsed[1:] += elapsed[0]
+	volts = ElectrometerCodec.to_volts(records["code"], pga)
+
+	# Split into channels preserving order within every channel
+	channel = records["channel"]
+	order = np.argsort(channel, kind = 'stable')
+	present, first = np.unique(channel[order], return_index = True)
+	bounds = list(first[1:]) + [len(order)]
+	channels = {}
+	for c, begin, end in zip(present.tolist(), first, bounds):
+		index = order[begin:end]
+		channels[c] = (elapsed[index], volts[index])
+	return (pga, dr, config, start_tick, start_ns, channels)
+
+if __name__ == "__main__":
+	if len(sys.argv) != 2:
+		print("Usage: %s <data.bin>" % sys.argv[0])
+		sys.exit(1)
+	pga, dr, config, start_tick, start_ns, channels = load(sys.argv[1])
+	print("Start: %s, PGA: +/-%.3f V, config: 0x%04X" % (time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(start_ns/1e9)), ElectrometerCodec.PGA_FSR[pga], config))
+	print("Samples: %d" % sum(len(t) for t, v in channels.values()))
+	for c in sorted(channels):
+		t, v = channels[c]
+		print("  Channel %d: %d samples over %.3f s, %+.4f V to %+.4f V" % (c, len(t), (t[-1] - t[0])/1e6, v.min(), v.max()))
@@ -0,0 +1,176 @@
+import pigpio
+
+# Primary ADC with address 0x48, secondary ADC with address 0x49
+# Addresses 0x48 (GND), 0x49 (VDD), 0x4A (SDA), 0x4B (SCL)
+DEVICE_BUS = 1
+DEVICE_ADDRS = [0x48, 0x49]
+
+# ALERT/RDY pins of primary and secondary ADC (BCM pins 24 and 10, header pins 18 and 19)
+DEVICE_GPIOS = [24, 10]
+
+# Address pointer register (P)
+# 07:02  Reserved[5:0]  Always write 0
+# 01:00  P[1:0]         Register address pointer
+#                         0b00: Conversion register
+#                         0b01: Configuration register
+#                         0b10: Low threshold register
+#                         0b11: High threshold register
+REG_CONV = 0x00  # 0b00
+REG_CONF = 0x01  # 0b01
+REG_LOW  = 0x02  # 0b02
+REG_HIGH = 0x03  # 0b03
+
+# Configuration register
+# 15     OS             Operational status or single-shot start
+# 14:12  MUX[2:0]       Input multiplexer configuration
+# 11:09  PGA[2:0]       Programmable gain amplifier configuration
+# 08     MODE           Device operating mode
+# 07:05  DR[2:0]        Data rate
+# 04     COMP_MODE      Comparator mode
+# 03     COMP_POL       Comparator polarity
+# 02     COMP_LAT       Latching comparator
+# 01:00  COMP_QUE[1:0]  Comparator queue
+
+# CONF_OS: 0b0 No Effect, 0b1 Start Single Conversion
+CONF_OS = 0x00 # 0b0
+
+# CONF_MUX: 0b100 AIN0, 0b101 AIN1, 0b110 AIN2, 0b111 AIN3
+CONF_MUX = (1 << 2) | 0x00 # 0b1XX
+
+# CONF_PGA: 0b000 6.144V, 0b001 4.096V, 0b010 2.048V, 0b011 1.024V,
+#           0b100 0.512V, 0b101 0.256V, 0b110 0.256V, 0b111 0.256V
+CONF_PGA = 0x01 # 0b001
+
+# CONF_MODE: 0b0 Continuous, 0b1 Single-shot
+CONF_MODE = 0x00 # 0b0
+
+# CONF_DR: 0b000   8 SPS, 0b001  16 SPS, 0b010  32 SPS, 0b011  64 SPS,
+#          0b100 128 SPS, 0b101 250 SPS, 0b110 475 SPS, 0b111 860 SPS
+CONF_DR = 0x07 # 0b111
+
+# CONF_COMP_MODE: 0b0 Traditional, 0b1 Window
+CONF_COMP_MODE = 0x00 # 0b0
+
+# CONF_COMP_POL: 0b0 Active low, 0b1 Active high
+CONF_COMP_POL = 0x00 # 0b0
+
+# CONF_COMP_LAT: 0b0 Nonlatching, 0b1 Latching
+CONF_COMP_LAT = 0x00 # 0b0
+
+# CONF_COMP_QUE: 0b00 After 1, 0b01 After 2, 0b10 After 4, 0b11 Disabled
+# Must not be disabled for ALERT/RDY to pulse at the end of every conversion
+CONF_COMP_QUE = 0x00 # 0b00
+
+# Number of input channels on each ADC
+CHANNELS = 4
+
+# Every sample takes three I2C transactions (conversion and configuration reads, multiplexer write), about
+# 120 SCL cycles, on a bus shared by both chips; at 860 SPS that is about 0.6 ms of every 1.16 ms at
+# 400 kHz, while the default 100 kHz cannot keep up, so set dtparam=i2c_arm_baudrate=400000 in
+# /boot/config.txt
+BUS_CLOCK_MINIMUM = 400000
+
+# I2C clock of bus in Hz as set in the device tree, or None if it cannot be read
+def bus_clock(bus):
+	try:
+		with open('/sys/class/i2c-adapter/i2c-%d/of_node/clock-frequency' % bus, 'rb') as fh:
+			return int.from_bytes(fh.read(4), 'big')
+	except (OSError, ValueError):
+		return None
+
+# Samples both ADS1115 chips in continuous conversion mode, cycling the input multiplexer of
+# each chip through its channels round-robin
+# ALERT/RDY pulses low at the end of every conversion; the persistent callback for that chip reads
+# the result, then the configuration register, whose multiplexer bits name the channel the result
+# belongs to, and only then writes the multiplexer setting of the following channel, which restarts
+# conversion there. A late or coalesced ALERT/RDY therefore never shifts samples onto the wrong
+# channel: until the multiplexer is switched, the chip keeps converting the channel read back
+# Every sample is passed to sink(tick, chip, channel, raw) in the pigpio callback thread, where
+# raw is the conversion register as returned by smbus read_word_data (bytes swapped)
+# 860 SPS needs a 400 kHz bus (see BUS_CLOCK_MINIMUM); each channel switch restarts conversion after
+# the reads, so each chip delivers somewhat fewer samples per second than its data rate
+class ElectrometerSampler:
+	def __init__(self, pi, bus, sink, addrs = DEVICE_ADDRS, gpios = DEVICE_GPIOS, channels = range(CHANNELS), pga = CONF_PGA, dr = CONF_DR, bus_number = DEVICE_BUS):
+		self.pi = pi
+		self.bus = bus
+		self.sink = sink
+		self.addrs = list(addrs)
+		self.gpios = list(gpios)
+		self.channels = list(channels)
+		self.pga = pga
+		self.dr = dr
+		self.bus_number = bus_number
+		self.callbacks = []
+
+		# Number of samples taken from each chip
+		self.samples = [0]*len(self.addrs)
+
+		# Number of results discarded because the multiplexer named no sampled channel
+		self.unknown = [0]*len(self.addrs)
+
+		# Precompute configuration bytes for every channel, and those of the channel sampled after it
+		self.configs = [self.config(channel) for channel in self.channels]
+		self.following = {channel: self.configs[(index + 1) % len(self.channels)] for index, channel in enumerate(self.channels)}
+
+	# Generate configuration bytes connecting multiplexer to channel
+	def config(self, channel):
+		mux = (1 << 2) | channel # 0b1XX
+		return [(CONF_OS << 7) | (mux << 4) | (self.pga << 1) | CONF_MODE, (self.dr << 5) | (CONF_COMP_MODE << 4) | (CONF_COMP_POL << 3) | (CONF_COMP_LAT << 2) | CONF_COMP_QUE]
+
+	# Configuration register value as a 16 bit word
+	def config_word(self, channel):
+		config = self.config(channel)
+		return (config[0] << 8) | config[1]
+
+	def start(self):
+		clock = bus_clock(self.bus_number)
+		# Only the 860 SPS data rate (0b111) needs more than the default 100 kHz
+		if self.dr == 0x07 and clock is not None and clock < BUS_CLOCK_MINIMUM:
+			print("I2C bus %d runs at %d Hz, too slow for 860 SPS on %d chips; set dtparam=i2c_arm_baudrate=%d" % (self.bus_number, clock, len(self.addrs), BUS_CLOCK_MINIMUM))
+
+		for chip, (addr, gpio) in enumerate(zip(self.addrs, self.gpios)):
+			self.pi.set_mode(gpio, pigpio.INPUT)
+			self.pi.set_pull_up_down(gpio, pigpio.PUD_UP)
+
+			# Set Lo_thresh and Hi_thresh registers to enable conversion ready pin
+			# Set most significant bit of Lo_thresh register to 0
+			self.bus.write_i2c_block_data(addr, REG_LOW, [0x00, 0x00])
+			# Set most significant bit of Hi_thresh register to 1
+			self.bus.write_i2c_block_data(addr, REG_HIGH, [0x80, 0x00])
+
+			self.callbacks.append(self.pi.callback(gpio, pigpio.FALLING_EDGE, self.ready))
+
+			# Start continuous conversion on first channel
+			self.bus.write_i2c_block_data(addr, REG_CONF, self.configs[0])
+
+	def stop(self):
+		for cb in self.callbacks:
+			cb.cancel()
+		self.callbacks = []
+
+		# Return chips to power-down single-shot mode
+		for addr in self.addrs:
+			config = self.config(self.channels[0])
+			self.bus.write_i2c_block_data(addr, REG_CONF, [config[0] | 0x01, config[1]])
+
+	# Conversion ready interrupt service routine
+	def ready(self, gpio, level, tick):
+		if gpio not in self.gpios: return
+		chip = self.gpios.index(gpio)
+		addr = self.addrs[chip]
+
+		# Read result, then the multiplexer setting it was converted with (bytes swapped like raw),
+		# and only then switch multiplexer to the following channel
+		raw = self.bus.read_word_data(addr, REG_CONV)
+		conf = self.bus.read_word_data(addr, REG_CONF)
+		mux = (conf >> 4) & 0x07
+		channel = mux & 0x03 if mux & 0x04 else None
+		if channel not in self.following:
+			self.unknown[chip] += 1
+			self.bus.write_i2c_block_data(addr, REG_CONF, self.configs[0])
+			return
+		if len(self.channels) > 1:
+			self.bus.write_i2c_block_data(addr, REG_CONF, self.following[channel])
+
+		self.samples[chip] += 1
+		self.sink(tick, chip, channel, raw)
@@ -28,6 +28,14 @@ function i2cpoll {
 
 }
 
+# Resident supervisor already holds every subsystem, so just ask it
+if [ -S /tmp/ccdr.sock ]
+then
+	echo "** SUPERVISOR HEALTH **"
+	python3 CCDR/CCDRClient.py health
+	exit $?
+fi
+
 echo "** INITIAL STATE **"
 i2cpoll
 
@@ -42,9 +50,11 @@ rm -rf data
 python Electrometer/ADCInterruptTest.py &
 adcpid=$!
 sleep 2
-kill -9 $adcpid
-data=$(ls data/*.txt)
-if [ $(cat "$data" | wc | awk '{print $1}') -gt 5 ]
+# Stop the test like Ctrl+C would, and wait until it has written every queued sample and closed its file
+kill -TERM $adcpid
+wait $adcpid
+data=$(ls data/*.bin)
+if [ $(python Electrometer/ElectrometerFile.py "$data" | grep Samples | awk '{print $2}') -gt 5 ]
 then echo "Electrometer Data Succcess"
 else echo "ELECTROMETER DATA FAILURE"
 fi
@@ -3,11 +3,15 @@
 import sys
 import time
 import pigpio
+import Timebase
 
 HEARTBEAT_PIN = 18
 HEARTBEAT_FREQ = 20
 HEARTBEAT_DUTY = 50
 
+# Heartbeat calibration points (extended tick, host time) used to convert recorded ticks after the fact
+CALIBRATION_FILE = 'heartbeat.cal'
+
 # At microsecond granularity, maximum time that can be stored in X number of bytes:
 # 3.0 bytes:                                                  16 secs
 # 3.5 bytes:                                         04 mins, 28 secs
@@ -36,41 +40,21 @@ HEARTBEAT_DUTY = 50
 # 4.0 bytes: 68 years, 01 months, 06 days, 06 hours, 28 mins, 15 secs
 
 # Tick is 4 byte integer indicating microseconds elapsed so resets every 71.5 minutes
-def heartbeat(gpio, level, tick):
-	#print("0x%08X" % tick)
-	pass
-
+# Timebase follows every falling edge of the heartbeat to extend ticks to 64 bits and fits them to host time
 pi = pigpio.pi()
 pi.set_mode(HEARTBEAT_PIN, pigpio.OUTPUT)
 pi.hardware_PWM(HEARTBEAT_PIN, HEARTBEAT_FREQ, HEARTBEAT_DUTY*10000)
 
-overflow = False
-ticktime = {
-	"overflows": 0,
-	"zerotick": pi.get_current_tick(),
-	"inittime": int(time.time()*1e6)
-}
-
-cb = pi.callback(HEARTBEAT_PIN, pigpio.FALLING_EDGE, heartbeat)
-
-def handle_overflow():
-	global ticktime, overflow
-	difftick = pigpio.tickDiff(ticktime["zerotick"], pi.get_current_tick()) - 0x80000000
-	if difftick > 0 and not overflow:
-		overflow = True
-	elif difftick < 0 and overflow:
-		overflow = False
-		ticktime["overflows"] += 1
+timebase = Timebase.Timebase(pi, HEARTBEAT_PIN, CALIBRATION_FILE)
+timebase.start()
 
 while True:
 	try:
-		handle_overflow()
-
 		ticktimetest = pi.get_current_tick()
-		timetimetest = int(time.time()*1e6)
-		ticktimetest = ticktime["overflows"] * 0xFFFFFFFF + ticktimetest- ticktime["zerotick"] + ticktime["inittime"]
+		timetimetest = time.time_ns()
+		epochtimetest = timebase.to_epoch_ns(ticktimetest)
 
-		sys.stdout.write("0x%010X 0x%010X %+08d " % (ticktimetest, timetimetest, ticktimetest-timetimetest))
+		sys.stdout.write("0x%013X 0x%013X %+08d " % (timebase.extend(ticktimetest), timetimetest//1000, (epochtimetest - timetimetest)//1000))
 		sys.stdout.flush()
 
 		for i in range(1,5*6+1):
@@ -81,10 +65,11 @@ while True:
 			sys.stdout.flush()
 
 		print()
+		print(timebase.status())
 
 	except KeyboardInterrupt:
 		print()
 		break
 
-cb.cancel()
+timebase.stop()
 pi.stop()
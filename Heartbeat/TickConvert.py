@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import numpy as np
+# Capture file modules live next to their capture scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CCDR'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Electrometer'))
+import PLPStream
+import ElectrometerFile
+
+# pigpio ticks are 32 bit microsecond counters that wrap every 2**32 us (about 71.6 minutes)
+TICK_WRAP = 1 << 32
+TICK_HALF = 1 << 31
+
+# Calibration point stored in the heartbeat calibration file (appended as it is taken, little-endian)
+#  tick  - extended 64 bit tick of heartbeat edge
+#  ns    - host time (time.time_ns) at which the edge was observed
+CALIBRATION_DTYPE = np.dtype([
+	("tick", "<i8"),
+	("ns",   "<i8")
+])
+
+# Number of consecutive calibration points fitted together; fits are interpolated between block centres
+CALIBRATION_BLOCK = 600
+
+# Calibration points whose host/tick offset differs from the capture's by more than this many ns belong
+# to a different pigpiod session (ticks restart whenever pigpiod does) and are ignored
+SESSION_TOLERANCE_NS = 60*1000000000
+
+# Extend a 32 bit tick to 64 bits using host time taken at about the same moment
+# Wraps are counted from the epoch, so the extended tick is within half a wrap of time.time() in
+# microseconds and every process (and every file with a start tick and start ns) extends ticks alike
+def extend_tick(tick, ns):
+	return tick + ((ns//1000 - tick + TICK_HALF)//TICK_WRAP)*TICK_WRAP
+
+# Load calibration points written by Timebase
+# Return structured array of CALIBRATION_DTYPE, ignoring a partially written final point
+def load_calibration(filename):
+	return np.fromfile(filename, dtype = CALIBRATION_DTYPE)
+
+# Unwrap column of 32 bit ticks recorded in order after start tick into extended 64 bit ticks
+# Consecutive ticks must be less than one wrap apart
+def unwrap(ticks, start_tick, start_ns):
+	ticks = np.asarray(ticks, dtype = np.uint32)
+	extended = np.empty(len(ticks), dtype = np.int64)
+	if len(ticks) == 0: return extended
+	extended[0] = extend_tick(start_tick, start_ns) + ((int(ticks[0]) - start_tick) & 0xFFFFFFFF)
+	np.cumsum(np.diff(ticks), out = extended[1:])
+	extended[1:] += extended[0]
+	return extended
+
+# Fit host time against extended tick over blocks of calibration points belonging to the session of a
+# capture started at (start_tick, start_ns)
+# Return tuple of (block centre ticks, host/tick offset in ns at centres, ns per tick of every block)
+def fit_calibration(calibration, start_tick, start_ns, block = CALIBRATION_BLOCK):
+	offset = calibration["ns"] - calibration["tick"]*1000
+	start_offset = start_ns - extend_tick(start_tick, start_ns)*1000
+	points = calibration[np.abs(offset - start_offset) <= SESSION_TOLERANCE_NS]
+	points = points[np.argsort(points["tick"], kind = 'stable')]
+	if len(points) == 0: return (np.empty(0, dtype = np.int64), np.empty(0), np.empty(0))
+
+	# Least squares line through every block from per-block sums, relative to first point of block
+	edges = np.arange(0, len(points), block)
+	first = np.repeat(edges, np.diff(np.append(edges, len(points))))
+	x = (points["tick"] - points["tick"][first]).astype(np.float64)
+	y = (points["ns"] - points["ns"][first]).astype(np.float64)
+	n = np.add.reduceat(np.ones(len(points)), edges)
+	sx = np.add.reduceat(x, edges)
+	sy = np.add.reduceat(y, edges)
+	sxx = np.add.reduceat(x*x, edges)
+	sxy = np.add.reduceat(x*y, edges)
+	denominator = n*sxx - sx*sx
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		rate = np.where(denominator > 0, (n*sxy - sx*sy)/denominator, 1000.0)
+	intercept = (sy - rate*sx)/n
+
+	# Evaluate every block's line at its mean tick, where it is best determined
+	centre = points["tick"][edges] + np.round(sx/n).astype(np.int64)
+	ns = points["ns"][edges] + np.round(intercept + rate*(sx/n)).astype(np.int64)
+	return (centre, (ns - centre*1000).astype(np.float64), rate)
+
+# Convert column of 32 bit ticks recorded after start tick into int64 host time in ns since the epoch
+# Host/tick offset is interpolated linearly between calibration block centres and extrapolated with the
+# rate of the first or last block; without calibration points the nominal tick rate from start is used
+def to_epoch_ns(ticks, start_tick, start_ns, calibration = None):
+	extended = unwrap(ticks, start_tick, start_ns)
+	if calibration is None or len(calibration) == 0:
+		return start_ns + (extended - extend_tick(start_tick, start_ns))*1000
+
+	centre, offset, rate = fit_calibration(calibration, start_tick, start_ns)
+	if len(centre) == 0:
+		return start_ns + (extended - extend_tick(start_tick, start_ns))*1000
+
+	# Work relative to first centre so float64 keeps sub-nanosecond resolution
+	x = (extended - centre[0]).astype(np.float64)
+	cx = (centre - centre[0]).astype(np.float64)
+	correction = np.interp(x, cx, offset)
+	correction += np.where(x < cx[0], (x - cx[0])*(rate[0] - 1000.0), 0.0)
+	correction += np.where(x > cx[-1], (x - cx[-1])*(rate[-1] - 1000.0), 0.0)
+	return extended*1000 + np.round(correction).astype(np.int64)
+
+# Load (start tick, start ns, tick column) of an Electrometer or PLP capture file
+def load_ticks(filename):
+	with open(filename, 'rb') as fh:
+		magic = fh.read(4)
+	if magic == b'ELEC':
+		with open(filename, 'rb') as fh:
+			header = fh.read(ElectrometerFile.FILE_HEADER.size)
+		magic, version, pga, dr, config, start_tick, start_ns = ElectrometerFile.FILE_HEADER.unpack(header)
+		records = np.fromfile(filename, dtype = ElectrometerFile.RECORD_DTYPE, offset = ElectrometerFile.FILE_HEADER.size)
+		return (start_tick, start_ns, records["tick"])
+	if magic == b'PLPS':
+		start_tick, start_ns, headers, words, offsets = PLPStream.load(filename)
+		return (start_tick, start_ns, headers["tick"])
+	raise ValueError("unknown capture file format")
+
+def utc_text(ns):
+	return "%s.%09d UTC" % (time.strftime("%Y/%m/%d %H:%M:%S", time.gmtime(ns // 1000000000)), ns % 1000000000)
+
+# Write epoch ns of every record of capture file to <capture file>.epoch.npy
+def main(calfilename, filename):
+	calibration = load_calibration(calfilename)
+	start_tick, start_ns, ticks = load_ticks(filename)
+	epoch = to_epoch_ns(ticks, start_tick, start_ns, calibration)
+	np.save(filename + ".epoch.npy", epoch)
+
+	print("Calibration points: %d" % len(calibration))
+	print("Records:            %d" % len(epoch))
+	if len(epoch):
+		print("First record:       %s" % utc_text(int(epoch[0])))
+		print("Last record:        %s" % utc_text(int(epoch[-1])))
+	print("Saved '%s'" % (filename + ".epoch.npy"))
+
+if __name__ == "__main__":
+	if len(sys.argv) != 3:
+		print("Usage: %s <heartbeat.cal> <capture.bin>" % sys.argv[0])
+		sys.exit(1)
+	main(sys.argv[1], sys.argv[2])
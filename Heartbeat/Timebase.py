@@ -0,0 +1,124 @@
+import time
+import threading
+import collections
+import numpy as np
+import pigpio
+import TickConvert
+
+# Heartbeat PWM output (BCM pin 18), also used as the timebase reference edge
+HEARTBEAT_PIN = 18
+HEARTBEAT_FREQ = 20
+
+# Store one calibration point every this many heartbeat edges (once per second at 20 Hz)
+CALIBRATION_EDGES = HEARTBEAT_FREQ
+
+# Number of most recent calibration points the offset/drift model is fitted to
+CALIBRATION_WINDOW = 600
+
+# Seconds between refits of the model (and appends to the calibration file)
+REFIT_INTERVAL = 10.0
+
+# 64 bit monotonic timebase built on pigpio ticks
+# Every heartbeat edge on pin 18 advances the extended tick anchor, so rollovers are tracked as long as
+# an edge (or refit) arrives at least once every half wrap; every CALIBRATION_EDGES edges the edge tick is
+# paired with host time and a linear offset/drift model of host time against extended tick is refitted in
+# the background
+# extend() and to_epoch_ns() only read two attributes and do integer arithmetic, so they are safe and cheap
+# to call from other pigpio callbacks
+class Timebase(threading.Thread):
+	def __init__(self, pi, pin = HEARTBEAT_PIN, calibration = None, window = CALIBRATION_WINDOW, interval = REFIT_INTERVAL):
+		threading.Thread.__init__(self, daemon = True)
+		self.pi = pi
+		self.pin = pin
+		self.interval = interval
+		self.stopped = threading.Event()
+		self.lock = threading.Lock()
+
+		# Calibration points used for the fit and points not yet appended to the calibration file
+		self.points = collections.deque(maxlen = window)
+		self.unsaved = []
+		self.fh = open(calibration, 'ab') if calibration is not None else None
+
+		# Extended tick of most recent edge; ticks within half a wrap of it are extended relative to it
+		tick = pi.get_current_tick()
+		ns = time.time_ns()
+		self.anchor = TickConvert.extend_tick(tick, ns)
+		self.origin = self.anchor
+
+		# Model as tuple of (reference extended tick, host ns at reference tick, ns per tick), replaced
+		# atomically on every refit; starts from a single point and nominal rate
+		self.model = (self.anchor, ns, 1000.0)
+
+		self.edges = 0
+		self.fits = 0
+
+		self.cb = pi.callback(pin, pigpio.FALLING_EDGE, self.edge)
+
+	# Extend 32 bit tick taken within half a wrap of the most recent edge
+	def extend(self, tick):
+		anchor = self.anchor
+		return anchor + ((tick - anchor + TickConvert.TICK_HALF) & 0xFFFFFFFF) - TickConvert.TICK_HALF
+
+	# Convert 32 bit tick to host time in integer nanoseconds since the epoch
+	def to_epoch_ns(self, tick):
+		ref_tick, ref_ns, rate = self.model
+		return ref_ns + int((self.extend(tick) - ref_tick)*rate)
+
+	# Heartbeat edge callback
+	def edge(self, gpio, level, tick):
+		ns = time.time_ns()
+		extended = self.extend(tick)
+		self.anchor = extended
+
+		self.edges += 1
+		if self.edges % CALIBRATION_EDGES: return
+		# Callback latency only ever delays ns, which the least squares fit averages out
+		with self.lock:
+			self.points.append((extended, ns))
+			self.unsaved.append((extended, ns))
+
+	# Refit model to calibration points and append new points to calibration file
+	def refit(self):
+		with self.lock:
+			points = np.array(self.points, dtype = np.int64).reshape(-1, 2)
+			unsaved, self.unsaved = self.unsaved, []
+
+		if self.fh is not None and unsaved:
+			self.fh.write(np.array(unsaved, dtype = np.int64).reshape(-1, 2).view(TickConvert.CALIBRATION_DTYPE).tobytes())
+			self.fh.flush()
+
+		if len(points) < 2: return
+		# Fit relative to newest point to keep float64 precision at the nanosecond level
+		x = (points[:, 0] - points[-1, 0]).astype(np.float64)
+		y = (points[:, 1] - points[-1, 1]).astype(np.float64)
+		rate, intercept = np.polyfit(x, y, 1)
+		self.model = (int(points[-1, 0]), int(points[-1, 1]) + int(round(intercept)), float(rate))
+		self.fits += 1
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			# Keep anchor fresh even if the heartbeat stops so rollovers are never missed
+			self.anchor = self.extend(self.pi.get_current_tick())
+			self.refit()
+
+	# Stop thread, cancel callback, and write remaining calibration points
+	def stop(self):
+		self.cb.cancel()
+		self.stopped.set()
+		if self.is_alive(): self.join()
+		self.refit()
+		if self.fh is not None: self.fh.close()
+
+	# Number of rollovers since timebase was started
+	def wraps(self):
+		return (self.anchor >> 32) - (self.origin >> 32)
+
+	# Offset of host clock from extended tick clock (in ns) at reference point and drift of tick clock
+	# relative to host clock (in ppm)
+	def offset_drift(self):
+		ref_tick, ref_ns, rate = self.model
+		return (ref_ns - ref_tick*1000, (1000.0/rate - 1.0)*1e6)
+
+	def status(self):
+		offset, drift = self.offset_drift()
+		return "Timebase: %d edges, %d wraps, %d points, %d fits, offset %+d ns, drift %+.3f ppm" % (self.edges, self.wraps(), len(self.points), self.fits, offset, drift)
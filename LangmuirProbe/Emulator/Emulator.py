@@ -0,0 +1,202 @@
+import os
+import sys
+import tty
+import time
+import select
+import numpy as np
+
+# Command byte bit definitions live with the PLP interface one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import LangmuirProbe as PLP
+
+# Swept bias codes as in ExampleData: SWEEP_STEPS steps of about 170 codes from SWEEP_LOW to SWEEP_HIGH
+SWEEP_LOW = 0x0AF0
+SWEEP_HIGH = 0x3510
+SWEEP_STEPS = 64
+
+# Bias code held in fixed bias modes
+FIXED_BIAS = 0x2000
+
+# Current codes of the pulsed I-V curve in ExampleData: ion and electron saturation, the bias code at
+# which electron current reaches saturation, the width in bias codes of its exponential rise, and the
+# slight slope of both saturation regions in current codes per bias code
+ION_SATURATION = 0x0F00
+ELECTRON_SATURATION = 0x3080
+KNEE_BIAS = 0x1FF0
+KNEE_WIDTH = 120
+SATURATION_SLOPE = 0.025
+
+# In continuous mode the current only follows the direction of the sweep
+CONTINUOUS_RISING = 0x3040
+CONTINUOUS_FALLING = 0x0FF0
+
+# Current code at zero bias and current codes per bias code across the calibration resistors
+CALIBRATION_ZERO = 0x2000
+CALIBRATION_GAIN_50K = 0.5
+CALIBRATION_GAIN_50M = 0.0005
+
+# Standard deviation of noise added to every current code
+NOISE = 6.0
+
+# Delay before the first frame after entering science mode, as on the Arduino emulator
+SCIENCE_DELAY = 0.005
+
+# Frames generated at once when running at maximum rate
+MAX_RATE_FRAMES = 4096
+
+# Bytes waiting to be written beyond which output is discarded, as a UART receiver would overrun
+PENDING_LIMIT = 65536
+
+# Seconds between status lines
+STATUS_INTERVAL = 10
+
+# Bias code of every frame of the waveform selected by bits 3 and 4
+#  Single:                    triangle sweep up and down
+#  Pseudo-absolute:           sawtooth sweep resetting to SWEEP_LOW
+#  Pseudo-absolute, pulsed:   sawtooth sweep returning to SWEEP_LOW between steps
+#  Tech demo:                 handled separately as a 32 bit counter
+def waveform(command):
+	ramp = np.round(np.linspace(SWEEP_LOW, SWEEP_HIGH, SWEEP_STEPS)).astype(np.int64)
+	if command & PLP.BIAS_FIXED: return np.array([FIXED_BIAS], dtype = np.int64)
+	wave = command & PLP.WAVE_TECH_DEMO
+	if wave == PLP.WAVE_PSEUDO_ABSOLUTE: return ramp
+	if wave == PLP.WAVE_PSEUDO_ABSOLUTE_PULSED: return np.column_stack((np.full(SWEEP_STEPS, SWEEP_LOW), ramp)).ravel()
+	return np.concatenate((ramp, ramp[-2:0:-1]))
+
+# Noise free current code for bias codes of the command's mode; rising marks frames where bias is rising
+def current(command, bias, rising):
+	calibration = command & PLP.CALIB_NONE == 0
+	if calibration:
+		gain = CALIBRATION_GAIN_50M if command & PLP.CALIB_50M else CALIBRATION_GAIN_50K
+		return CALIBRATION_ZERO + (bias - FIXED_BIAS)*gain
+	if not command & PLP.OPER_PULSED and not command & PLP.BIAS_FIXED:
+		return np.where(rising, CONTINUOUS_RISING, CONTINUOUS_FALLING).astype(np.float64)
+	electron = (ELECTRON_SATURATION - ION_SATURATION)*np.exp(np.minimum(bias - KNEE_BIAS, 0)/float(KNEE_WIDTH))
+	return ION_SATURATION + electron + (bias - KNEE_BIAS)*SATURATION_SLOPE
+
+# Speaks the PLP protocol on the master side of a pseudo-terminal
+# Command bytes written to the slave side switch modes exactly as on the board: the MSB starts science
+# mode, and the speed, bias, operation, waveform and calibration bits select the frames sent
+# Frames are 4 bytes, voltage then current, big-endian, paced at the expected frame rate of the speed
+# bit unless a rate (frames per second, or 0 for as fast as the reader takes them) is given
+class Emulator:
+	def __init__(self, rate = None, link = None, seed = 0):
+		self.rate = rate
+		self.link = link
+		self.rng = np.random.default_rng(seed)
+
+		self.master, self.slave = os.openpty()
+		tty.setraw(self.slave)
+		os.set_blocking(self.master, False)
+		self.port = os.ttyname(self.slave)
+		if link is not None:
+			if os.path.lexists(link): os.remove(link)
+			os.symlink(self.port, link)
+
+		self.command = PLP.MODE_IDLE
+		self.science = False
+		self.index = 0
+		self.pending = bytearray()
+
+		# Time the next frame is due and frames sent since it was last set
+		self.origin = time.monotonic()
+		self.sent = 0
+
+		self.commands = 0
+		self.frames = 0
+		self.dropped = 0
+
+	# Frames per second of current mode, or 0 for maximum rate
+	def frame_rate(self):
+		if self.rate is not None: return self.rate
+		return PLP.FRAME_RATE_FAST if self.command & PLP.SPEED_FAST else PLP.FRAME_RATE_SLOW
+
+	# Apply command byte received from the host
+	def receive(self, command):
+		self.commands += 1
+		science = bool(command & PLP.MODE_SCIENCE)
+		if science and (not self.science or command != self.command):
+			self.origin = time.monotonic() + SCIENCE_DELAY
+			self.sent = 0
+		self.command = command
+		self.science = science
+		print("Command byte 0x%02X: %s" % (command, "science" if science else "idle"))
+
+	# Build n frames continuing the current waveform
+	def build(self, n):
+		index = self.index + np.arange(n, dtype = np.int64)
+		self.index += n
+		if self.command & PLP.WAVE_TECH_DEMO == PLP.WAVE_TECH_DEMO and self.command & PLP.CALIB_NONE:
+			return (index & 0xFFFFFFFF).astype('>u4').tobytes()
+
+		wave = waveform(self.command)
+		bias = wave[index % len(wave)]
+		rising = bias >= wave[(index - 1) % len(wave)]
+		values = current(self.command, bias, rising) + self.rng.normal(0.0, NOISE, n)
+		frames = np.empty((n, 2), dtype = '>u2')
+		frames[:, 0] = bias
+		frames[:, 1] = np.clip(np.round(values), 0, 0x3FFF)
+		return frames.tobytes()
+
+	# Queue every frame due by now and write as much as the pty takes
+	def transmit(self):
+		if self.science:
+			rate = self.frame_rate()
+			if rate == 0: due = MAX_RATE_FRAMES if len(self.pending) < MAX_RATE_FRAMES*4 else 0
+			else: due = int((time.monotonic() - self.origin)*rate) - self.sent
+			if due > 0:
+				self.pending += self.build(due)
+				self.sent += due
+				self.frames += due
+		if len(self.pending) > PENDING_LIMIT:
+			# Nobody is reading; a real UART keeps sending and the receiver loses the bytes
+			self.dropped += len(self.pending)
+			self.pending = bytearray()
+		if self.pending:
+			try: written = os.write(self.master, self.pending)
+			except BlockingIOError: written = 0
+			del self.pending[:written]
+
+	# Seconds until the next frame is due, or None at maximum rate to wait for the reader
+	def wait(self):
+		if not self.science: return STATUS_INTERVAL
+		rate = self.frame_rate()
+		if rate == 0: return None
+		return max(self.origin + (self.sent + 1)/float(rate) - time.monotonic(), 0.0)
+
+	def status(self):
+		return "Emulator: mode 0x%02X (%s), %d commands, %d frames sent, %d bytes dropped" % (self.command, "science" if self.science else "idle", self.commands, self.frames, self.dropped)
+
+	def run(self):
+		last = time.monotonic()
+		while True:
+			writing = [self.master] if self.pending or (self.science and self.frame_rate() == 0) else []
+			readable, writable, errored = select.select([self.master], writing, [], self.wait())
+			if readable:
+				try: data = os.read(self.master, 1024)
+				except BlockingIOError: data = b''
+				for command in data: self.receive(command)
+			self.transmit()
+			if time.monotonic() - last >= STATUS_INTERVAL:
+				print(self.status())
+				last = time.monotonic()
+
+	def close(self):
+		if self.link is not None and os.path.islink(self.link): os.remove(self.link)
+		os.close(self.master)
+		os.close(self.slave)
+
+if __name__ == "__main__":
+	if len(sys.argv) > 3:
+		print("Usage: %s [link path] [frames/s|max]" % sys.argv[0])
+		sys.exit(1)
+	link = sys.argv[1] if len(sys.argv) > 1 else None
+	rate = None
+	if len(sys.argv) > 2: rate = 0 if sys.argv[2] == "max" else float(sys.argv[2])
+
+	emulator = Emulator(rate, link)
+	print("Emulating PLP on %s%s" % (emulator.port, " (linked from %s)" % link if link else ""))
+	try: emulator.run()
+	except KeyboardInterrupt: pass
+	print(emulator.status())
+	emulator.close()
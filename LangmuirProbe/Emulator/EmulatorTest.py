@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+# Acquisition code under test lives one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import LangmuirProbe as PLP
+import LangmuirProbeAcquisition
+
+# Seconds between status lines while acquiring
+STATUS_INTERVAL = 10
+
+# Profile from LangmuirProbe.MODES sent for the run unless given on the command line
+MODE = "swept-pulsed-slow"
+
+# Frames per second blocks are sized for when Emulator.py runs at 'max' rate, about what a pty
+# delivers on a desktop PC (the two blocks then take 64 MB)
+MAX_TEST_RATE = 4000000
+
+# Load test of LangmuirProbeAcquisition against Emulator.py started with the same rate, e.g.
+#  python3 Emulator.py /tmp/plp max
+#  python3 EmulatorTest.py 5 /tmp/plp max
+# Blocks are sized for the rate the emulator sends instead of the profile's, so that the test measures
+# the reader and writer rather than undersized blocks
+if len(sys.argv) < 3 or len(sys.argv) > 5:
+	print("Usage: %s <seconds> <pty> [frames/s|max] [mode]" % sys.argv[0])
+	sys.exit(1)
+totalruntime = float(sys.argv[1])
+port = sys.argv[2]
+mode = sys.argv[4] if len(sys.argv) > 4 else MODE
+
+plp = PLP.LangmuirProbe(pin_reset = 11, pin_enable = 13, pin_status = 16, port = port)
+profile = plp.set_mode(mode)
+
+frame_rate = profile.frame_rate
+if len(sys.argv) > 3: frame_rate = MAX_TEST_RATE if sys.argv[3] == "max" else float(sys.argv[3])
+
+filename = 'emulator.bin'
+print("Saving data to '%s'..." % filename)
+acquisition = LangmuirProbeAcquisition.LangmuirProbeAcquisition(plp, filename, profile.command, frame_rate)
+print("Expecting %d frames/s (%d bytes/s), %d frame blocks" % (frame_rate, frame_rate*PLP.FRAME_BYTES, acquisition.block_frames))
+
+print("Taking data for %d seconds..." % totalruntime)
+starttime = time.time()
+acquisition.start()
+try:
+	while time.time() - starttime < totalruntime and acquisition.is_running():
+		time.sleep(min(STATUS_INTERVAL, max(starttime + totalruntime - time.time(), 0)))
+		print(acquisition.status())
+except KeyboardInterrupt:
+	pass
+acquisition.stop()
+print(acquisition.status())
+
+if acquisition.healthy: plp.set_mode("idle")
+plp.close()
+if acquisition.error is not None or acquisition.bytes_lost(): sys.exit(1)
@@ -22,8 +22,16 @@
 
 import sys
 import serial
-import RPi.GPIO as GPIO
 import time
+import collections
+import numpy as np
+
+# Without RPi.GPIO (e.g. when reading from the software emulator on a PC) the reset, enable and
+# status pins are not driven or checked
+try:
+	import RPi.GPIO as GPIO
+except ImportError:
+	GPIO = None
 
 # Bit 0 determines data collection speed
 # 0: Slow
@@ -67,17 +75,112 @@ CALIB_NONE = 0x02 << 5
 MODE_IDLE    = 0x00 << 7
 MODE_SCIENCE = 0x01 << 7
 
+# Frames per second sent at each speed setting
+# Slow mode is about 640 frames/s in ExampleData; fast mode is limited by the 115200 baud link itself
+# (10 bits per byte, 4 bytes per frame)
+FRAME_RATE_SLOW = 640
+FRAME_RATE_FAST = 115200//10//4
+
+# Every sample is a 4 byte frame of two big-endian words, voltage then current
+FRAME_BYTES = 4
+
+# Command profile: command byte, expected frames per second, and the bytes per second a reader has
+# to keep up with (sizing buffers and serial timeouts); calibration marks bytes with bit 6 clear
+Mode = collections.namedtuple("Mode", ["command", "frame_rate", "bytes_per_second", "calibration"])
+
+# Profile of command byte sending frame_rate frames per second
+def make_mode(command, frame_rate):
+	return Mode(command, frame_rate, frame_rate*FRAME_BYTES, not command & CALIB_NONE)
+
+# Named command profiles, built once at import
+#  idle                              - MSB clear; bit 6 stays set, since a byte with bits 5 and 6
+#                                      clear selects 50 Kohm calibration
+#  <bias>-<operation>-<speed>        - single waveform, e.g. 'swept-pulsed-slow' (0xE2)
+#  <waveform>-<operation>-<speed>    - swept pseudo-absolute waveforms, e.g. 'pseudo-absolute-pulsed-slow'
+#                                      (0xCA) and 'pulsed-pseudo-absolute-continuous-slow' (0xD0)
+#  tech-demo-<speed>                 - 32 bit counter instead of frames; read it with sync_mask = 0
+#  calibration-<resistor>-<speed>    - swept bias across the 50 Kohm or 50 Mohm calibration resistor
+def build_modes():
+	speeds = (("slow", SPEED_SLOW, FRAME_RATE_SLOW), ("fast", SPEED_FAST, FRAME_RATE_FAST))
+	opers = (("continuous", OPER_CONTINUOUS), ("pulsed", OPER_PULSED))
+	modes = {"idle": make_mode(MODE_IDLE | CALIB_NONE, 0)}
+	for speed_name, speed, rate in speeds:
+		for bias_name, bias in (("swept", BIAS_SWEPT), ("fixed", BIAS_FIXED)):
+			for oper_name, oper in opers:
+				modes["%s-%s-%s" % (bias_name, oper_name, speed_name)] = make_mode(MODE_SCIENCE | CALIB_NONE | WAVE_SINGLE | bias | oper | speed, rate)
+		for wave_name, wave in (("pseudo-absolute", WAVE_PSEUDO_ABSOLUTE), ("pulsed-pseudo-absolute", WAVE_PSEUDO_ABSOLUTE_PULSED)):
+			for oper_name, oper in opers:
+				modes["%s-%s-%s" % (wave_name, oper_name, speed_name)] = make_mode(MODE_SCIENCE | CALIB_NONE | wave | BIAS_SWEPT | oper | speed, rate)
+		modes["tech-demo-%s" % speed_name] = make_mode(MODE_SCIENCE | CALIB_NONE | WAVE_TECH_DEMO | speed, rate)
+		for calib_name, calib in (("50k", CALIB_50K), ("50m", CALIB_50M)):
+			modes["calibration-%s-%s" % (calib_name, speed_name)] = make_mode(MODE_SCIENCE | calib | WAVE_SINGLE | BIAS_SWEPT | OPER_CONTINUOUS | speed, rate)
+	return modes
+
+MODES = build_modes()
+
+# Return Mode of named profile
+def mode(name):
+	if name not in MODES:
+		raise ValueError("unknown PLP mode '%s', expected one of: %s" % (name, ", ".join(sorted(MODES))))
+	return MODES[name]
+
+# Bits that are always clear in both words of a valid frame, since the PLP ADCs are 14 bit
+# The Arduino emulator sends a 32 bit counter instead, so pass sync_mask = 0 when reading from it
+SYNC_MASK = 0xC000
+
+# Number of consecutive valid frames required to accept a new frame alignment after a bad frame
+SYNC_FRAMES = 8
+
+# Number of frames before a bad frame that are not trusted as the last valid frame when realigning
+PREVIOUS_BACK = 4
+
+# A loss of 2 bytes (mod 4) keeps every word within 14 bits, so the sync mask never sees it; instead
+# both words are extrapolated linearly from two earlier frames, and a frame matching the extrapolation
+# at least SWAP_RATIO times better crossed (current first, then the voltage of the following frame)
+# than straight, missing it straight by at least SWAP_JUMP codes, marks a slip
+# Frames are extrapolated from two and three frames back, since a slip usually leaves one frame made
+# of two words of the same kind in between
+SWAP_RATIO = 2
+SWAP_JUMP = 256
+
+# Largest number of bytes requested from the serial port at once
+READ_CHUNK = 4096
+
+# Hardware UART of the Raspberry Pi; Emulator/Emulator.py prints the pty to use instead
+PORT = "/dev/serial0"
+
 class LangmuirProbe:
-	def __init__(self, pin_reset, pin_enable, pin_status):
+	def __init__(self, pin_reset, pin_enable, pin_status, sync_mask = SYNC_MASK, port = PORT):
+		self.port = port
 		self.pin_reset = pin_reset
 		self.pin_enable = pin_enable
 		self.pin_status = pin_status
+		self.sync_mask = sync_mask
+
+		# Bytes received but not yet returned as whole frames, and frames already checked by frames() but
+		# beyond the number requested, returned first by the next read without being checked again
+		self.residue = b''
+		self.checked = b''
+
+		# Number of frame realignments and bytes discarded while realigning
+		self.resyncs = 0
+		self.skipped = 0
+
+		# Last one or two valid frames, used to tell voltage and current words apart when realigning
+		self.previous = None
+
+		# Name of profile most recently sent with set_mode
+		self.mode = None
+
 		self.setup_gpio()
 		self.reset()
 		self.enable()
 		self.ser_init()
 
 	def setup_gpio(self):
+		if GPIO is None:
+			print("RPi.GPIO not available, PLP pins will not be used")
+			return
 		print("Initializing GPIO...")
 		GPIO.setmode(GPIO.BOARD)
 		GPIO.setup(self.pin_reset, GPIO.OUT)
@@ -85,6 +188,7 @@ class LangmuirProbe:
 		GPIO.setup(self.pin_status, GPIO.IN)
 
 	def reset(self):
+		if GPIO is None: return
 		print("Resetting FPGA...")
 		GPIO.output(self.pin_reset, GPIO.LOW)
 		time.sleep(0.1)
@@ -92,15 +196,17 @@ class LangmuirProbe:
 		time.sleep(0.1)
 
 	def close(self):
-		GPIO.cleanup()
+		if GPIO is not None: GPIO.cleanup()
 		self.ser.close()
 
 	def enable(self):
+		if GPIO is None: return
 		print("Enabling board...")
 		GPIO.output(self.pin_enable, GPIO.HIGH)
 		time.sleep(0.1)
 
 	def disable(self):
+		if GPIO is None: return
 		print("Disabling board...")
 		GPIO.output(self.pin_enable, GPIO.LOW)
 		time.sleep(0.1)
@@ -108,7 +214,7 @@ class LangmuirProbe:
 	def ser_init(self):
 		print("Initializing serial port...")
 		self.ser = serial.Serial(
-			port="/dev/serial0",
+			port=self.port,
 			baudrate = 115200,
 			parity = serial.PARITY_NONE,
 			stopbits = serial.STOPBITS_ONE,
@@ -119,21 +225,159 @@ class LangmuirProbe:
 			print("Failed to open serial port!")
 			sys.exit(1)
 
-	def send_command_byte(self, command_byte):
-		# Always set second MSB to avoid calibration mode
-		command_byte = command_byte | 0x40
+	# Send command byte exactly as given
+	# Bytes with bit 6 clear select a calibration mode and are refused unless calibration is True
+	def send_command_byte(self, command_byte, calibration = False):
+		if not command_byte & CALIB_NONE and not calibration:
+			raise ValueError("command byte 0x%02X selects calibration mode; OR in CALIB_NONE or pass calibration = True" % command_byte)
 		print("Sending command byte 0x%02X..." % command_byte)
 		command_byte = bytes([command_byte])
 		self.ser.write(command_byte)
 
+	# Send command byte of named profile; calibration profiles are sent as such
+	# Return Mode of profile
+	def set_mode(self, name):
+		profile = mode(name)
+		self.send_command_byte(profile.command, profile.calibration)
+		self.mode = name
+		return profile
+
 	def read_data(self):
-		data = self.ser.read(4)
-		current = data[2] << 8 | data[3]
-		voltage = data[0] << 8 | data[1]
-		return (voltage, current)
-		
+		voltage, current = self.read_block(1)
+		return (int(voltage[0]), int(current[0]))
+
+	# Read n frames in large chunks, dropping bytes to realign whenever a frame fails the sync mask or
+	# voltage and current look swapped (a 2 byte slip, which the sync mask cannot see; see swapped)
+	# Return tuple of (voltage, current) uint16 arrays, shorter than n only if the serial port timed out
+	def read_block(self, n):
+		frames = [self.checked]
+		count = len(self.checked)//FRAME_BYTES
+		data = self.residue
+		self.residue = b''
+		while count < n:
+			good, data = self.frames(data)
+			if good:
+				frames.append(good)
+				count += len(good)//FRAME_BYTES
+			if count >= n: break
+			want = max((n - count)*FRAME_BYTES - len(data), FRAME_BYTES)
+			chunk = self.ser.read(min(max(want, self.ser.in_waiting), READ_CHUNK))
+			if not chunk: break
+			data += chunk
+
+		# Keep frames beyond the requested number for the next read
+		block = b''.join(frames)
+		self.checked = block[n*FRAME_BYTES:]
+		self.residue = data
+		words = np.frombuffer(block[:n*FRAME_BYTES], dtype = '>u2').astype(np.uint16)
+		return (words[0::2], words[1::2])
+
+	# Split bytes into leading run of whole valid frames and remaining bytes, realigning past bad frames
+	# Bytes are only dropped once SYNC_FRAMES valid frames confirm the new alignment, so a chunk
+	# boundary never causes a false resync
+	# Every run of valid frames is also checked for word order slips (see swapped), dropping 2 bytes at
+	# the slip to restore voltage, current order
+	def frames(self, data):
+		good = []
+		while len(data) >= FRAME_BYTES:
+			usable = len(data) - len(data) % FRAME_BYTES
+			words = np.frombuffer(data[:usable], dtype = '>u2')
+			bad = np.flatnonzero(((words[0::2] | words[1::2]) & self.sync_mask) != 0)
+			slip = self.swapped(words[:2*bad[0]] if len(bad) else words)
+			if slip is not None:
+				first = slip*FRAME_BYTES
+				if first:
+					good.append(data[:first])
+					self.remember(data[:first], first)
+				self.resyncs += 1
+				self.skipped += 2
+				data = data[first + 2:]
+				continue
+			if len(bad) == 0:
+				# Last frame stays unread until the frame after it has been checked for a slip
+				if self.sync_mask: usable -= FRAME_BYTES
+				if usable:
+					good.append(data[:usable])
+					self.remember(data[:usable], usable)
+					data = data[usable:]
+				break
+
+			# Accept frames before first bad frame, then look for next offset starting a valid run
+			first = bad[0]*FRAME_BYTES
+			if first:
+				good.append(data[:first])
+				# Misaligned frames often pass the mask, so the frames just before a bad frame are suspect
+				self.remember(data[:first], first - PREVIOUS_BACK*FRAME_BYTES)
+			data = data[first:]
+			offset = self.realign(data)
+			if offset is None: break # Not enough data yet to confirm any alignment
+			self.resyncs += 1
+			self.skipped += offset
+			data = data[offset:]
+		return (b''.join(good), data)
+
+	# Index of frame of words at which 2 bytes have to be dropped to undo the first word order slip, or
+	# None; the last valid frames precede words as context
+	# Of the frame where the slip is seen and the one before it, the drop goes where the words after it
+	# follow the frames before the slip best, which also removes a frame mixing two words of one kind
+	# Slips where voltage and current are within a few hundred codes of each other can be missed, and
+	# those in the pulsed, pseudo-absolute waveform, whose bias jumps every frame, almost always are.
+	# A missed slip leaves voltage and current swapped for the rest of the capture, and bytes_lost()
+	# does not count its 2 bytes
+	# Not checked with sync_mask = 0, whose frames are counters
+	def swapped(self, words):
+		if not self.sync_mask: return None
+		frames = words.astype(np.int64).reshape(-1, 2)
+		first = 0
+		if self.previous is not None:
+			frames = np.concatenate((np.frombuffer(self.previous, dtype = '>u2').astype(np.int64).reshape(-1, 2), frames))
+			first = len(self.previous)//FRAME_BYTES
+		if len(frames) < 4: return None
+		step = frames[1:-2] - frames[:-3]
+		predicted = frames[1:-2] + 2*step
+		after = frames[3:]
+		straight = np.abs(after - predicted).sum(axis = 1)
+		crossed = np.abs(after[:, 0] - predicted[:, 1]) + np.abs(after[:, 1] - predicted[:, 0] - step[:, 0])
+		seen = np.flatnonzero((straight >= SWAP_JUMP) & (crossed*SWAP_RATIO < straight))
+		if len(seen) == 0: return None
+
+		# Frame seen as swapped is j, the last frame before the slip is j - 2
+		j = seen[0] + 3
+		if j - 1 >= first:
+			expected = 2*frames[j - 2] - frames[j - 3]
+			earlier = np.array((frames[j - 1, 1], frames[j, 0]))
+			if np.abs(earlier - expected).sum() < np.abs(frames[j - 1] - expected).sum(): j -= 1
+		return max(j - first, 0)
+
+	# Keep up to two frames ending at end bytes into data (after the frames kept before) as the last
+	# valid frames
+	def remember(self, data, end):
+		if end < FRAME_BYTES: return
+		self.previous = ((self.previous or b'') + data[:end])[-2*FRAME_BYTES:]
+
+	# Find offset into data (starting at a bad frame) of the next run of SYNC_FRAMES valid frames
+	# The sync mask restores word alignment, but nothing marks which word is voltage, so when the runs at
+	# offset and offset + 2 are both valid, take the one continuing the last valid frame more smoothly
+	# Return None if data is too short to decide
+	def realign(self, data):
+		run = SYNC_FRAMES*FRAME_BYTES
+		candidates = []
+		for offset in range(1, len(data) - run - 1):
+			words = np.frombuffer(data[offset:offset + run], dtype = '>u2')
+			if np.any((words & self.sync_mask) != 0): continue
+			candidates.append(offset)
+			if len(candidates) == 2 or self.previous is None: break
+		if not candidates: return None
+		if len(candidates) == 1 or candidates[1] != candidates[0] + 2: return candidates[0]
+
+		last = np.frombuffer(self.previous[-FRAME_BYTES:], dtype = '>u2').astype(np.int64)
+		def jump(offset):
+			return np.abs(np.frombuffer(data[offset:offset + FRAME_BYTES], dtype = '>u2').astype(np.int64) - last).sum()
+		return min(candidates, key = jump)
+
 	def check_status(self):
 		# Check LP_STATUS_PIN; if bad status, abort
+		if GPIO is None: return True
 		if GPIO.input(self.pin_status) == GPIO.HIGH:
 			print("Status check failed, disabling board!")
 			self.disable()
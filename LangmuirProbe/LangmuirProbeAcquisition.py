@@ -0,0 +1,245 @@
+import sys
+import math
+import time
+import queue
+import struct
+import threading
+import numpy as np
+
+### PLP ACQUISITION FILE FORMAT ###
+#
+#  ######## 16 BYTE HEADER ########
+#  #  4 bytes - Magic ('PLPA')
+#  #  1 byte  - Format version
+#  #  1 byte  - Command byte sent to PLP
+#  #  2 bytes - Unused
+#  #  8 bytes - Host time at start of capture (integer number of nanoseconds)
+#  ###############################
+#
+#  ######## BLOCK (REPEATED) ########
+#  #  8 bytes - Host time before first read of block (integer number of nanoseconds)
+#  #  8 bytes - Host time after last read of block (integer number of nanoseconds)
+#  #  4 bytes - Number of frames (N)
+#  #  4 bytes - Total bytes lost before end of block (realignment and overruns)
+#  #  N * 2 bytes - Voltage words
+#  #  N * 2 bytes - Current words
+#  ##################################
+#
+# All values are little-endian. One block is written at a time, so a file is
+# valid up to the last complete block even if capture is interrupted.
+#
+###################################
+
+MAGIC = b'PLPA'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sBB2xq')
+BLOCK_HEADER = struct.Struct('<qqII')
+
+# Frames per block; a block is about 1.4 s of fast mode data at 115200 baud
+BLOCK_FRAMES = 4096
+
+# Number of blocks passed back and forth between reader and writer (2 for plain double buffering)
+BLOCK_COUNT = 2
+
+# Seconds after which a partially filled block is handed to the writer, so slow modes still reach disk
+BLOCK_SECONDS = 1.0
+
+# Frames requested from LangmuirProbe.read_block at once
+READ_FRAMES = 256
+
+# Serial read timeout in seconds, so the reader notices stop requests even if the PLP goes quiet
+READ_TIMEOUT = 0.5
+
+# Factor by which blocks sized from an expected frame rate exceed BLOCK_SECONDS of data at that rate
+BLOCK_HEADROOM = 2.0
+
+# Size blocks and serial timeout for a PLP sending frame_rate frames per second
+# Blocks hold BLOCK_HEADROOM times BLOCK_SECONDS of data in whole reads, and the timeout covers one
+# whole read with the same headroom
+# Return tuple of (block frames, read timeout in seconds)
+def sizing(frame_rate, block_seconds = BLOCK_SECONDS):
+	if frame_rate <= 0: return (BLOCK_FRAMES, READ_TIMEOUT)
+	reads = int(math.ceil(frame_rate*block_seconds*BLOCK_HEADROOM/READ_FRAMES))
+	return (max(reads, 1)*READ_FRAMES, max(READ_TIMEOUT, READ_FRAMES*BLOCK_HEADROOM/frame_rate))
+
+# Reads frames from a LangmuirProbe on a dedicated thread into preallocated numpy blocks and writes
+# full blocks to file on a second thread
+# Blocks circulate between the threads through two queues; if the writer falls so far behind that no
+# block is free, the reader keeps draining the serial port and counts the frames it has to discard,
+# so a disk stall costs data but never backs up the UART
+# Passing the expected frame_rate of the PLP mode sizes blocks and serial timeout with sizing()
+class LangmuirProbeAcquisition:
+	def __init__(self, plp, filename, command, frame_rate = None, block_frames = BLOCK_FRAMES, block_count = BLOCK_COUNT, block_seconds = BLOCK_SECONDS):
+		read_timeout = READ_TIMEOUT
+		if frame_rate is not None: block_frames, read_timeout = sizing(frame_rate, block_seconds)
+		self.plp = plp
+		self.block_frames = block_frames
+		self.block_seconds = block_seconds
+		self.stopped = threading.Event()
+
+		self.voltage = np.zeros((block_count, block_frames), dtype = np.uint16)
+		self.current = np.zeros((block_count, block_frames), dtype = np.uint16)
+		self.filled = [0]*block_count
+
+		# Indices of blocks ready to be filled and blocks waiting to be written
+		self.free = queue.Queue()
+		self.full = queue.Queue()
+		for index in range(block_count): self.free.put(index)
+
+		# Number of frames read, frames discarded because no block was free, and blocks written
+		self.frames = 0
+		self.overruns = 0
+		self.blocks = 0
+
+		# Frames per second over the most recent block
+		self.rate = 0.0
+
+		# False once the PLP status check fails
+		self.healthy = True
+
+		# Exception that stopped the writer (such as a full disk), which also stops the reader
+		self.error = None
+
+		self.start_ns = time.time_ns()
+		self.fh = open(filename, 'wb')
+		self.fh.write(FILE_HEADER.pack(MAGIC, VERSION, command & 0xFF, self.start_ns))
+
+		self.plp.ser.timeout = read_timeout
+		self.reader = threading.Thread(target = self.read, daemon = True)
+		self.writer = threading.Thread(target = self.write, daemon = True)
+
+	def start(self):
+		self.writer.start()
+		self.reader.start()
+
+	# Stop reading, then wait for every filled block to be written
+	def stop(self):
+		self.stopped.set()
+		if self.reader.is_alive(): self.reader.join()
+		if self.writer.is_alive(): self.writer.join()
+		try: self.fh.close()
+		except OSError as e:
+			if self.error is None: self.error = e
+
+	def is_running(self):
+		return self.reader.is_alive() and self.error is None
+
+	# Bytes lost to frame realignment and to overruns
+	def bytes_lost(self):
+		return self.plp.skipped + self.overruns*4
+
+	# Fraction of block memory holding frames not yet written
+	def buffer_fill(self):
+		return sum(self.filled)/float(self.voltage.size)
+
+	# Return tuple of (frames per second, bytes lost, buffer fill)
+	def stats(self):
+		return (self.rate, self.bytes_lost(), self.buffer_fill())
+
+	def status(self):
+		rate, lost, fill = self.stats()
+		status = "Acquisition: %d frames, %d blocks written, %.0f frames/s, %d bytes lost, %.0f%% buffer fill" % (self.frames, self.blocks, rate, lost, fill*100)
+		if self.error is not None: status += ", writer failed: %s" % self.error
+		return status
+
+	# Reader thread: fill free blocks until stopped or PLP status fails
+	def read(self):
+		while not self.stopped.is_set():
+			if not self.plp.check_status():
+				self.healthy = False
+				break
+			try: index = self.free.get_nowait()
+			except queue.Empty:
+				# Writer is behind; keep the serial port drained and account for the frames dropped
+				voltage, current = self.plp.read_block(READ_FRAMES)
+				self.frames += len(voltage)
+				self.overruns += len(voltage)
+				continue
+			self.fill(index)
+		self.full.put(None)
+
+	# Read frames into block until it is full, BLOCK_SECONDS have passed or a stop is requested
+	def fill(self, index):
+		start_ns = time.time_ns()
+		deadline = time.monotonic() + self.block_seconds
+		n = 0
+		while n < self.block_frames and time.monotonic() < deadline and not self.stopped.is_set():
+			voltage, current = self.plp.read_block(min(READ_FRAMES, self.block_frames - n))
+			self.voltage[index, n:n + len(voltage)] = voltage
+			self.current[index, n:n + len(current)] = current
+			n += len(voltage)
+			self.filled[index] = n
+			self.frames += len(voltage)
+		end_ns = time.time_ns()
+		if end_ns > start_ns: self.rate = n*1e9/(end_ns - start_ns)
+		self.full.put((index, start_ns, end_ns, self.bytes_lost()))
+
+	# Writer thread: write filled blocks in order and return them to the reader
+	# A failed write is stored in error and stops the reader; blocks still arriving are returned unwritten
+	# until the reader finishes
+	def write(self):
+		while True:
+			item = self.full.get()
+			if item is None: break
+			index, start_ns, end_ns, lost = item
+			n = self.filled[index]
+			if n and self.error is None:
+				try:
+					self.fh.write(BLOCK_HEADER.pack(start_ns, end_ns, n, lost & 0xFFFFFFFF))
+					self.fh.write(self.voltage[index, :n].astype('<u2', copy = False).tobytes())
+					self.fh.write(self.current[index, :n].astype('<u2', copy = False).tobytes())
+					self.fh.flush()
+					self.blocks += 1
+				except Exception as e:
+					self.error = e
+					self.stopped.set()
+			self.filled[index] = 0
+			self.free.put(index)
+
+# Load file written by LangmuirProbeAcquisition
+# Host time of every frame is interpolated between the start and end times of its block
+# Return tuple of (command byte, start ns, block headers, seconds since start, voltage, current)
+def load(filename):
+	raw = np.fromfile(filename, dtype = np.uint8)
+	if len(raw) < FILE_HEADER.size:
+		raise ValueError("file too short to contain header")
+	magic, version, command, start_ns = FILE_HEADER.unpack_from(raw, 0)
+	if magic != MAGIC: raise ValueError("not a PLP acquisition file")
+	if version != VERSION: raise ValueError("unsupported PLP acquisition version %d" % version)
+
+	# Walk block headers only; words are sliced out as whole arrays
+	headers = []
+	voltage = []
+	current = []
+	pos = FILE_HEADER.size
+	while pos + BLOCK_HEADER.size <= len(raw):
+		header = BLOCK_HEADER.unpack_from(raw, pos)
+		n = header[2]
+		pos += BLOCK_HEADER.size
+		if pos + 4*n > len(raw): break # Ignore partially written final block
+		headers.append(header)
+		voltage.append(raw[pos:pos + 2*n].view('<u2'))
+		current.append(raw[pos + 2*n:pos + 4*n].view('<u2'))
+		pos += 4*n
+
+	blocks = np.array(headers, dtype = np.int64).reshape(-1, 4)
+	voltage = np.concatenate(voltage).astype(np.uint16) if voltage else np.empty(0, dtype = np.uint16)
+	current = np.concatenate(current).astype(np.uint16) if current else np.empty(0, dtype = np.uint16)
+
+	# Frame i of an n frame block is read at start + (end - start)*(i + 1)/n
+	counts = blocks[:, 2]
+	first = np.repeat(np.cumsum(counts) - counts, counts)
+	position = (np.arange(len(voltage)) - first + 1)/np.repeat(counts, counts).astype(np.float64)
+	ns = np.repeat(blocks[:, 0] - start_ns, counts) + np.repeat(blocks[:, 1] - blocks[:, 0], counts)*position
+	return (command, start_ns, blocks, ns/1e9, voltage, current)
+
+if __name__ == "__main__":
+	if len(sys.argv) != 2:
+		print("Usage: %s <data.bin>" % sys.argv[0])
+		sys.exit(1)
+	command, start_ns, blocks, runtime, voltage, current = load(sys.argv[1])
+	print("Start: %s, command byte: 0x%02X" % (time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(start_ns/1e9)), command))
+	print("Blocks: %d, frames: %d" % (len(blocks), len(voltage)))
+	if len(blocks):
+		print("Duration: %.3f s, bytes lost: %d" % ((blocks[-1, 1] - blocks[0, 0])/1e9, blocks[-1, 3]))
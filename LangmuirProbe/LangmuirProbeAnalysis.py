@@ -0,0 +1,216 @@
+import sys
+import numpy as np
+import LangmuirProbeAcquisition
+
+# Nominal conversion of ADC codes to probe bias (V) and probe current (A)
+# The 14 bit bias code spans -10 V to +10 V and the current code is zero at mid scale; replace with a
+# bench calibration of the board before trusting absolute densities
+VOLTS_PER_CODE = 20.0/16384
+VOLTS_ZERO_CODE = 8192
+AMPS_PER_CODE = 1e-9
+AMPS_ZERO_CODE = 8192
+
+# Collecting area of the probe in m^2
+PROBE_AREA = 1e-4
+
+ELEMENTARY_CHARGE = 1.602176634e-19
+ELECTRON_MASS = 9.1093837015e-31
+
+# Bias steps smaller than this many codes are treated as noise and do not change sweep direction
+STEP_MINIMUM = 16
+
+# Sweeps with fewer points than this (such as the single step of a sawtooth reset) are discarded
+SWEEP_MINIMUM = 8
+
+# Fraction of every sweep's bias range at either end averaged for ion and electron saturation current
+SATURATION_FRACTION = 0.15
+
+# Sweeps whose electron and ion saturation currents differ by less than this many current codes show no
+# retardation region above the noise and are not fitted
+CONTRAST_MINIMUM = 256
+
+# Electron current between these fractions of electron saturation is fitted as the retardation region
+RETARDATION_LOW = 0.05
+RETARDATION_HIGH = 0.9
+
+# Quality gates every fit must pass, otherwise the sweep is reported as NaN
+# A retardation region of only a few samples is the current step of the instrument rather than an
+# exponential (every sweep of ExampleData has 3), so at least RETARDATION_MINIMUM samples are required,
+# ln(I - Iisat) must be a straight line against bias to FIT_R2_MINIMUM, and the current must rise with
+# bias across the fitted samples, never falling by more than MONOTONIC_TOLERANCE current codes
+RETARDATION_MINIMUM = 12
+FIT_R2_MINIMUM = 0.95
+MONOTONIC_TOLERANCE = 24
+
+# Number of sweeps fitted together; bounds memory of the padded arrays on full orbit captures
+FIT_SWEEPS = 16384
+
+# Result stored for every sweep
+#  start, stop  - index of first and last sample of sweep
+#  time         - seconds since start of capture at middle of sweep
+#  direction    - +1 for rising bias, -1 for falling bias
+#  te           - electron temperature (eV)
+#  density      - electron density (m^-3)
+#  vf           - floating potential (V)
+#  vp           - plasma potential (V), where the retardation fit meets electron saturation
+#  isat, esat   - ion and electron saturation current (A)
+#  points       - number of samples in retardation fit
+SWEEP_DTYPE = np.dtype([
+	("start",     "<i8"),
+	("stop",      "<i8"),
+	("time",      "<f8"),
+	("direction", "i1"),
+	("te",        "<f8"),
+	("density",   "<f8"),
+	("vf",        "<f8"),
+	("vp",        "<f8"),
+	("isat",      "<f8"),
+	("esat",      "<f8"),
+	("points",    "<i4")
+])
+
+# Load (seconds since start, voltage codes, current codes) of a binary capture from
+# LangmuirProbeAcquisition.py or a 'runtime, voltage, current' text file from earlier drivers
+def load(filename):
+	if filename.endswith('.bin'):
+		command, start_ns, blocks, runtime, voltage, current = LangmuirProbeAcquisition.load(filename)
+		return (runtime, voltage.astype(np.int64), current.astype(np.int64))
+	with open(filename, 'r') as f:
+		fields = f.read().split()
+	runtime = np.array([float(t.rstrip(',')) for t in fields[0::3]])
+	voltage = np.array([int(v.rstrip(','), 16) for v in fields[1::3]], dtype = np.int64)
+	current = np.array([int(c, 16) for c in fields[2::3]], dtype = np.int64)
+	return (runtime, voltage, current)
+
+# Split bias codes into sweeps wherever the bias changes direction
+# Both turnarounds of a triangle wave and resets of a sawtooth count: a reset is a single step against
+# the sweep direction, which becomes a two point sweep of its own and is dropped as too short
+# Return tuple of (first sample, last sample, direction) arrays; the turning sample belongs to both
+# sweeps it separates
+def split_sweeps(voltage, minimum = SWEEP_MINIMUM):
+	step = np.diff(np.asarray(voltage, dtype = np.int64))
+	sign = np.where(np.abs(step) >= STEP_MINIMUM, np.sign(step), 0)
+
+	# Carry last significant direction over small steps
+	last = np.maximum.accumulate(np.where(sign != 0, np.arange(len(sign)), -1))
+	direction = np.where(last >= 0, sign[np.maximum(last, 0)], 0)
+
+	turns = np.flatnonzero(direction[1:] != direction[:-1]) + 1
+	start = np.concatenate(([0], turns))
+	stop = np.concatenate((turns, [len(step)]))
+	keep = (stop - start + 1 >= minimum) & (direction[np.minimum(start, len(step) - 1)] != 0) if len(step) else np.zeros(0, dtype = bool)
+	return (start[keep], stop[keep], direction[start[keep]].astype(np.int8))
+
+# Mean of values along rows wherever mask is set; NaN for rows with no set element
+def masked_mean(values, mask):
+	n = mask.sum(axis = 1)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		return np.where(n > 0, np.where(mask, values, 0.0).sum(axis = 1)/n, np.nan)
+
+# Fit sweeps of volts and amps given by inclusive (start, stop) sample ranges in one batch
+# Saturation currents are averaged at the ends of every sweep's bias range, then ln(I - Iisat) is fitted
+# by least squares against bias over the retardation region, giving Te as the inverse slope
+# Sweeps failing the quality gates (too few retardation samples, poor R^2, or current not rising with
+# bias) get NaN for te, density, vf and vp
+# Return tuple of (te, density, vf, vp, isat, esat, points) arrays
+def fit_sweeps(volts, amps, start, stop):
+	length = stop - start + 1
+	columns = np.arange(length.max() if len(length) else 0)
+	valid = columns < length[:, None]
+	index = np.where(valid, start[:, None] + columns, 0)
+	v = volts[index]
+	i = amps[index]
+
+	vmin = np.where(valid, v, np.inf).min(axis = 1, initial = np.inf)
+	vmax = np.where(valid, v, -np.inf).max(axis = 1, initial = -np.inf)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		position = (v - vmin[:, None])/(vmax - vmin)[:, None]
+	isat = masked_mean(i, valid & (position <= SATURATION_FRACTION))
+	esat = masked_mean(i, valid & (position >= 1.0 - SATURATION_FRACTION))
+
+	# Electron current relative to its saturation value selects the retardation region
+	electron = i - isat[:, None]
+	saturation = esat - isat
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		ratio = electron/saturation[:, None]
+		mask = valid & (ratio > RETARDATION_LOW) & (ratio < RETARDATION_HIGH) & (saturation > CONTRAST_MINIMUM*AMPS_PER_CODE)[:, None]
+		y = np.where(mask, np.log(np.where(mask, electron, 1.0)), 0.0)
+	x = np.where(mask, v, 0.0)
+
+	# Least squares line from per-sweep sums
+	n = mask.sum(axis = 1)
+	sx = x.sum(axis = 1)
+	sy = y.sum(axis = 1)
+	sxx = (x*x).sum(axis = 1)
+	sxy = (x*y).sum(axis = 1)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		denominator = n*sxx - sx*sx
+		slope = np.where((n >= 2) & (denominator > 0), (n*sxy - sx*sy)/denominator, np.nan)
+		intercept = (sy - slope*sx)/n
+
+		# Coefficient of determination of the line over the fitted samples
+		residual = np.where(mask, y - intercept[:, None] - slope[:, None]*x, 0.0)
+		spread = np.where(mask, y - (sy/n)[:, None], 0.0)
+		r2 = 1.0 - (residual*residual).sum(axis = 1)/(spread*spread).sum(axis = 1)
+
+	# Current must not fall as bias rises between neighbouring fitted samples (sweeps run either way)
+	pairs = mask[:, 1:] & mask[:, :-1]
+	rise = (i[:, 1:] - i[:, :-1])*np.sign(v[:, 1:] - v[:, :-1])
+	monotonic = ~np.any(pairs & (rise < -MONOTONIC_TOLERANCE*AMPS_PER_CODE), axis = 1)
+
+	good = (n >= RETARDATION_MINIMUM) & (r2 >= FIT_R2_MINIMUM) & monotonic
+	slope = np.where(good, slope, np.nan)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		te = np.where(slope > 0, 1.0/slope, np.nan)
+		vp = (np.log(saturation) - intercept)*te
+		vf = np.where(isat < 0, (np.log(-isat) - intercept)*te, np.nan)
+		density = saturation/(ELEMENTARY_CHARGE*PROBE_AREA*np.sqrt(ELEMENTARY_CHARGE*te/(2*np.pi*ELECTRON_MASS)))
+	return (te, density, vf, vp, isat, esat, n)
+
+# Split capture into sweeps and fit every sweep
+# Return structured array of SWEEP_DTYPE
+def analyze(runtime, voltage, current):
+	volts = (np.asarray(voltage, dtype = np.float64) - VOLTS_ZERO_CODE)*VOLTS_PER_CODE
+	amps = (np.asarray(current, dtype = np.float64) - AMPS_ZERO_CODE)*AMPS_PER_CODE
+	start, stop, direction = split_sweeps(voltage)
+
+	sweeps = np.zeros(len(start), dtype = SWEEP_DTYPE)
+	sweeps["start"] = start
+	sweeps["stop"] = stop
+	sweeps["time"] = (runtime[start] + runtime[stop])/2 if len(start) else 0.0
+	sweeps["direction"] = direction
+	for first in range(0, len(start), FIT_SWEEPS):
+		block = sweeps[first:first + FIT_SWEEPS]
+		te, density, vf, vp, isat, esat, points = fit_sweeps(volts, amps, block["start"], block["stop"])
+		block["te"] = te
+		block["density"] = density
+		block["vf"] = vf
+		block["vp"] = vp
+		block["isat"] = isat
+		block["esat"] = esat
+		block["points"] = points
+	return sweeps
+
+# Fit every sweep of capture file and save results to <capture file>.sweeps.npy
+def main(filename):
+	runtime, voltage, current = load(filename)
+	sweeps = analyze(runtime, voltage, current)
+	np.save(filename + ".sweeps.npy", sweeps)
+
+	fitted = sweeps[np.isfinite(sweeps["te"])]
+	print("Samples: %d" % len(voltage))
+	print("Sweeps:  %d (%d fitted)" % (len(sweeps), len(fitted)))
+	if len(sweeps) and not len(fitted):
+		print("No sweep passed the fit quality checks (%d+ retardation samples, R^2 >= %g, rising current); results are NaN" % (RETARDATION_MINIMUM, FIT_R2_MINIMUM))
+	if len(fitted):
+		print("Te:      %.4g eV median (%.4g to %.4g)" % (np.median(fitted["te"]), fitted["te"].min(), fitted["te"].max()))
+		print("Density: %.4g m^-3 median" % np.median(fitted["density"]))
+		print("Vf:      %.4g V median" % np.nanmedian(fitted["vf"]) if np.any(np.isfinite(fitted["vf"])) else "Vf:      no ion current")
+		print("Vp:      %.4g V median" % np.median(fitted["vp"]))
+	print("Saved '%s'" % (filename + ".sweeps.npy"))
+
+if __name__ == "__main__":
+	if len(sys.argv) != 2:
+		print("Usage: %s <data.bin|data.txt>" % sys.argv[0])
+		sys.exit(1)
+	main(sys.argv[1])
@@ -1,29 +1,40 @@
+import sys
 import time
 import LangmuirProbe as PLP
+import LangmuirProbeAcquisition
 
-plp = PLP.LangmuirProbe(pin_reset = 11, pin_enable = 13, pin_status = 16)
+# Seconds between status lines while acquiring
+STATUS_INTERVAL = 10
 
-plp.send_command_byte(PLP.MODE_SCIENCE | PLP.CALIB_NONE | PLP.WAVE_SINGLE | PLP.BIAS_SWEPT | PLP.OPER_PULSED | PLP.SPEED_SLOW)
+# Profile from LangmuirProbe.MODES sent for the run
+MODE = "swept-pulsed-slow"
 
-filename = 'data.txt'
-saveFile = open(filename, 'w')
+# Serial port may follow run time on the command line, e.g. the pty of Emulator/Emulator.py
+port = sys.argv[2] if len(sys.argv) > 2 else PLP.PORT
+plp = PLP.LangmuirProbe(pin_reset = 11, pin_enable = 13, pin_status = 16, port = port)
+
+profile = plp.set_mode(MODE)
+
+filename = 'data.bin'
 print("Saving data to '%s'..." % filename)
+acquisition = LangmuirProbeAcquisition.LangmuirProbeAcquisition(plp, filename, profile.command, profile.frame_rate)
+print("Expecting %d frames/s (%d bytes/s), %d frame blocks" % (profile.frame_rate, profile.bytes_per_second, acquisition.block_frames))
 
-totalruntime = 1
+# Run time in seconds may be given on the command line, e.g. 5400 for a whole orbit
+totalruntime = float(sys.argv[1]) if len(sys.argv) > 1 else 1
 print("Taking data for %d seconds..." % totalruntime)
 starttime = time.time()
-runtime = 0
-while runtime < totalruntime and plp.check_status():
-	try:
-		runtime = time.time() - starttime
-		voltage, current = plp.read_data()
-		datastr = "{0:.6f}, {1:x}, {2:x}\n".format(runtime, voltage, current)
-		saveFile.write(datastr)
-	except KeyboardInterrupt:
-		break
-
-saveFile.close()
+acquisition.start()
+try:
+	while time.time() - starttime < totalruntime and acquisition.is_running():
+		time.sleep(min(STATUS_INTERVAL, max(starttime + totalruntime - time.time(), 0)))
+		print(acquisition.status())
+except KeyboardInterrupt:
+	pass
+acquisition.stop()
+print(acquisition.status())
 
-plp.send_command_byte(PLP.MODE_IDLE)
+if acquisition.healthy: plp.set_mode("idle")
 plp.disable()
 plp.close()
+if acquisition.error is not None: sys.exit(1)
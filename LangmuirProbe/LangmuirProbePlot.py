@@ -1,30 +1,46 @@
+import os, sys
+import numpy as np
 print("Loading matplotlib into RAM...")
 import matplotlib.pyplot as plt
-print("Opening 'data.txt'...")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Plotting'))
+import DecimatedPlot
+import LangmuirProbeAcquisition
 
-runtime = []
-current = []
-voltage = []
-with open('data.txt', 'r') as f:
-	for line in f:
-		t, v, c = line.split(', ')
-		runtime.append(float(t))
-		current.append(int(c, 16))
-		voltage.append(int(v, 16))
+# Parse 'runtime, voltage, current' lines saved by LangmuirProbeDriver.py
+# Return list of (name, runtime, value) for voltage and current
+def load_channels(filename):
+	with open(filename, 'r') as f:
+		fields = f.read().split()
+	runtime = np.array([float(t.rstrip(',')) for t in fields[0::3]])
+	voltage = np.array([int(v.rstrip(','), 16) for v in fields[1::3]], dtype = np.int64)
+	current = np.array([int(c, 16) for c in fields[2::3]], dtype = np.int64)
+	return [("Voltage (arb)", runtime, voltage), ("Current (arb)", runtime, current)]
+
+# Load binary file saved by LangmuirProbeAcquisition.py in the same layout as load_channels
+def load_binary(filename):
+	command, start_ns, blocks, runtime, voltage, current = LangmuirProbeAcquisition.load(filename)
+	return [("Voltage (arb)", runtime, voltage.astype(np.int64)), ("Current (arb)", runtime, current.astype(np.int64))]
+
+# Binary files from LangmuirProbeDriver.py by default, text files from earlier drivers by extension
+filename = sys.argv[1] if len(sys.argv) > 1 else 'data.bin'
+print("Opening '%s'..." % filename)
+data = DecimatedPlot.DecimatedPlot(filename, load_binary if filename.endswith('.bin') else load_channels)
 
 print("Plotting voltage and current vs time...")
 plt.figure(1)
 plt.title("Langmuir Probe Data")
 plt.xlabel("Time (s)")
-plt.plot(runtime, voltage, label="Voltage (arb)")
-plt.plot(runtime, current, label="Current (arb)")
+data.plot(plt.gca())
 plt.legend()
 plt.savefig('CVvT.png', dpi=200)
 
 print("Plotting current vs voltage...")
+# Every distinct (voltage, current) pair only needs to be drawn once
+(name, runtime, voltage), (name, runtime, current) = data.load_raw()
+pairs = np.unique(np.column_stack((voltage, current)), axis = 0)
 plt.figure(2)
 plt.title("Langmuir Probe IV Curve")
 plt.xlabel("Voltage (arb)")
 plt.ylabel("Current (arb)")
-plt.plot(voltage, current, '.')
+plt.plot(pairs[:, 0], pairs[:, 1], '.')
 plt.savefig('CvV.png', dpi=200)
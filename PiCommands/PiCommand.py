@@ -0,0 +1,60 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CCDR'))
+import CCDRClient
+
+# Apply batch of enables, disables and PLP resets given as lists of subsystem names
+# ("electrometer", "plp", "picoscope") and return dictionary of resulting enable states
+# The batch is sent to CCDRSupervisor.py in one request when it is running, otherwise the pins are
+# written directly; either way pins of subsystems not named keep their state
+# Only a missing socket or a refused connection mean no supervisor is running; any other error may
+# come after the supervisor applied the batch, so it is raised rather than applying the batch again
+def apply(enable = None, disable = None, reset = None):
+	enable = list(enable or ())
+	disable = list(disable or ())
+	reset = list(reset or ())
+	try:
+		response = CCDRClient.command("apply", enable = enable, disable = disable, reset = reset)
+	except (FileNotFoundError, ConnectionRefusedError):
+		return apply_direct(enable, disable, reset)
+	if not response["ok"]: raise ValueError(response["error"])
+	return response["enabled"]
+
+# Write pins with pigpio; imported only here so clients of a running supervisor skip its import time
+def apply_direct(enable, disable, reset):
+	import pigpio
+	import CCDR
+	for name in enable + disable + reset:
+		if name not in CCDR.SUBSYSTEM_PINS: raise ValueError("unknown subsystem %r" % name)
+	if set(enable) & set(disable): raise ValueError("subsystem both enabled and disabled")
+	if any(name != "plp" for name in reset): raise ValueError("only plp can be reset")
+
+	pi = pigpio.pi()
+	ccdr = CCDR.CCDR(pi, reset_outputs = False)
+	states = {gpio: True for name in enable for gpio in CCDR.SUBSYSTEM_PINS[name]}
+	states.update({gpio: False for name in disable for gpio in CCDR.SUBSYSTEM_PINS[name]})
+	ccdr.generic_enable_many(states)
+	if reset: ccdr.reset_plp()
+	enabled = {name: pi.read(pins[0]) == 1 for name, pins in CCDR.SUBSYSTEM_PINS.items()}
+	pi.stop()
+	return enabled
+
+# Apply batch as apply() does, printing the error and exiting with status 1 if it is rejected or the
+# supervisor fails to answer, so scripts such as HealthStatus.sh report one line instead of a traceback
+def apply_or_exit(enable = None, disable = None, reset = None):
+	try:
+		return apply(enable, disable, reset)
+	except (ValueError, OSError) as e:
+		print("Error: %s" % e)
+		sys.exit(1)
+
+if __name__ == "__main__":
+	commands = {"enable": [], "disable": [], "reset": []}
+	if len(sys.argv) < 3 or len(sys.argv) % 2 == 0 or any(action not in commands for action in sys.argv[1::2]):
+		print("Usage: %s <enable|disable|reset> <subsystem> [<enable|disable|reset> <subsystem> ...]" % sys.argv[0])
+		sys.exit(1)
+	for action, name in zip(sys.argv[1::2], sys.argv[2::2]):
+		commands[action].append(name)
+	enabled = apply_or_exit(**commands)
+	for name, state in sorted(enabled.items()):
+		print("%s: %s" % (name, "enabled" if state else "disabled"))
@@ -1,6 +1,3 @@
-import pigpio
+import PiCommand
 
-pi = pigpio.pi()
-pi.set_mode(17, pigpio.OUTPUT)
-pi.write(17, 0)
-pi.stop()
+PiCommand.apply_or_exit(disable = ("picoscope",))
@@ -1,6 +1,3 @@
-import pigpio
+import PiCommand
 
-pi = pigpio.pi()
-pi.set_mode(9, pigpio.OUTPUT)
-pi.write(9, 1)
-pi.stop()
+PiCommand.apply_or_exit(enable = ("electrometer",))
@@ -1,8 +1,3 @@
-import pigpio
+import PiCommand
 
-pi = pigpio.pi()
-pi.set_mode(23, pigpio.OUTPUT)
-pi.set_mode(27, pigpio.OUTPUT)
-pi.write(23, 1)
-pi.write(27, 1)
-pi.stop()
+PiCommand.apply_or_exit(enable = ("plp",))
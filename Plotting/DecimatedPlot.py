@@ -0,0 +1,159 @@
+import os
+import numpy as np
+
+# Number of raw samples merged into each bin of the finest pyramid level
+# Windows narrow enough to need finer detail are drawn from the raw samples instead
+PYRAMID_BASE = 64
+
+# Number of bins of one pyramid level merged into each bin of the next coarser level
+PYRAMID_FACTOR = 8
+
+# Stop adding levels once a level has no more than this many bins
+PYRAMID_MINIMUM = 1024
+
+# Width of rendered plots in pixels, matching a 6.4 inch wide figure saved at 200 dpi
+PIXELS = 1280
+
+# Bump whenever the layout of the cache file changes
+CACHE_VERSION = 1
+
+# Build min/max decimation pyramid of a single channel of time-sorted samples
+# Level k merges base*factor**k consecutive samples into one bin; extremes are stored as float32
+# Return list of (bin start time, bin minimum, bin maximum) tuples, finest level first
+def build_pyramid(t, v, base = PYRAMID_BASE, factor = PYRAMID_FACTOR, minimum = PYRAMID_MINIMUM):
+	levels = []
+	if len(t) <= base*minimum: return levels
+	edges = np.arange(0, len(t), base)
+	start = t[edges]
+	lo = np.minimum.reduceat(v, edges).astype(np.float32)
+	hi = np.maximum.reduceat(v, edges).astype(np.float32)
+	levels.append((start, lo, hi))
+	while len(start) > minimum:
+		edges = np.arange(0, len(start), factor)
+		start = start[edges]
+		lo = np.minimum.reduceat(lo, edges)
+		hi = np.maximum.reduceat(hi, edges)
+		levels.append((start, lo, hi))
+	return levels
+
+# Size and modification time identifying the contents of the data file a cache was built from
+def source_stamp(filename):
+	stat = os.stat(filename)
+	return np.array([stat.st_size, stat.st_mtime_ns], dtype = np.int64)
+
+# Save pyramids and (first, last) sample times of every channel to npz cache
+def save_pyramids(cachename, stamp, names, extents, pyramids):
+	arrays = {"version": CACHE_VERSION, "stamp": stamp, "layout": [PYRAMID_BASE, PYRAMID_FACTOR], "names": np.array(names), "extents": np.array(extents, dtype = np.float64)}
+	for i, levels in enumerate(pyramids):
+		arrays["levels_%d" % i] = len(levels)
+		for k, (start, lo, hi) in enumerate(levels):
+			arrays["start_%d_%d" % (i, k)] = start
+			arrays["lo_%d_%d" % (i, k)] = lo
+			arrays["hi_%d_%d" % (i, k)] = hi
+	# Write under temporary name first so an interrupted save never leaves a truncated cache behind
+	with open(cachename + ".tmp", 'wb') as fh:
+		np.savez(fh, **arrays)
+	os.replace(cachename + ".tmp", cachename)
+
+# Load pyramids from npz cache
+# Return tuple of (channel names, extents, pyramids), or None if the cache is missing or stale
+def load_pyramids(cachename, stamp):
+	try:
+		cache = np.load(cachename)
+	except (OSError, ValueError):
+		return None
+	with cache:
+		if int(cache["version"]) != CACHE_VERSION or cache["layout"].tolist() != [PYRAMID_BASE, PYRAMID_FACTOR]: return None
+		if not np.array_equal(cache["stamp"], stamp): return None
+		names = cache["names"].tolist()
+		extents = [tuple(extent) for extent in cache["extents"].tolist()]
+		pyramids = []
+		for i in range(len(names)):
+			levels = []
+			for k in range(int(cache["levels_%d" % i])):
+				levels.append((cache["start_%d_%d" % (i, k)], cache["lo_%d_%d" % (i, k)], cache["hi_%d_%d" % (i, k)]))
+			pyramids.append(levels)
+	return (names, extents, pyramids)
+
+# Reduce bins (or raw samples) falling between start and stop into one min/max pair per pixel column
+# Return tuple of (pixel column centre times, minimums, maximums)
+def reduce_pixels(t, lo, hi, start, stop, pixels):
+	if len(t) == 0 or stop <= start: return (np.empty(0), np.empty(0), np.empty(0))
+	column = ((t - start)*(pixels/(stop - start))).astype(np.int64)
+	np.clip(column, 0, pixels - 1, out = column)
+	edges = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+	x = start + (column[edges] + 0.5)*((stop - start)/pixels)
+	return (x, np.minimum.reduceat(lo, edges), np.maximum.reduceat(hi, edges))
+
+# Min/max envelope of every channel of a data file, rendered at pixel resolution for any time window
+# loader(filename) must return list of (channel name, time-sorted sample times, sample values) tuples
+# Pyramids are cached next to the data file as <filename>.pyramid.npz and rebuilt only when the data file
+# changes; raw samples are only loaded when zoomed in far enough that the finest level is coarser than a pixel
+class DecimatedPlot:
+	def __init__(self, filename, loader):
+		self.filename = filename
+		self.loader = loader
+		self.cachename = filename + ".pyramid.npz"
+		self.raw = None
+
+		stamp = source_stamp(filename)
+		cached = load_pyramids(self.cachename, stamp)
+		if cached is None:
+			self.load_raw()
+			self.names = [name for name, t, v in self.raw]
+			self.extents = [(float(t[0]), float(t[-1])) if len(t) else (np.nan, np.nan) for name, t, v in self.raw]
+			self.pyramids = [build_pyramid(t, v) for name, t, v in self.raw]
+			save_pyramids(self.cachename, stamp, self.names, self.extents, self.pyramids)
+		else:
+			self.names, self.extents, self.pyramids = cached
+
+	def load_raw(self):
+		if self.raw is None: self.raw = self.loader(self.filename)
+		return self.raw
+
+	# Time span covered by all channels
+	def extent(self):
+		extents = np.array(self.extents).reshape(-1, 2)
+		if np.all(np.isnan(extents)): return (0.0, 1.0)
+		return (float(np.nanmin(extents[:, 0])), float(np.nanmax(extents[:, 1])))
+
+	# Envelope of one channel between start and stop using the coarsest level with at least one bin per pixel
+	# Return tuple of (times, minimums, maximums)
+	def envelope(self, channel, start, stop, pixels = PIXELS):
+		for start_t, lo, hi in reversed(self.pyramids[channel]):
+			first = max(np.searchsorted(start_t, start, 'right') - 1, 0)
+			last = np.searchsorted(start_t, stop, 'right')
+			if last - first >= pixels:
+				return reduce_pixels(start_t[first:last], lo[first:last], hi[first:last], start, stop, pixels)
+
+		# Too few bins in window even at finest level, so reduce raw samples directly
+		name, t, v = self.load_raw()[channel]
+		first = np.searchsorted(t, start, 'left')
+		last = np.searchsorted(t, stop, 'right')
+		if last - first <= pixels: return (t[first:last], v[first:last], v[first:last])
+		return reduce_pixels(t[first:last], v[first:last], v[first:last], start, stop, pixels)
+
+	# Vertices tracing the envelope as a single polyline, one vertical stroke per pixel column
+	def polyline(self, channel, start, stop, pixels = PIXELS):
+		x, lo, hi = self.envelope(channel, start, stop, pixels)
+		return (np.repeat(x, 2), np.column_stack((lo, hi)).ravel())
+
+	# Plot envelope of every channel (or listed channels) on matplotlib axes between start and stop
+	# The envelope is recomputed from the cached levels whenever the x limits change (zooming or panning)
+	def plot(self, ax, start = None, stop = None, channels = None, pixels = PIXELS, **kwargs):
+		extent = self.extent()
+		if start is None: start = extent[0]
+		if stop is None: stop = extent[1]
+		if channels is None: channels = range(len(self.names))
+		lines = []
+		for channel in channels:
+			x, y = self.polyline(channel, start, stop, pixels)
+			line, = ax.plot(x, y, label = self.names[channel], linewidth = 0.5, **kwargs)
+			lines.append((channel, line))
+		ax.set_xlim(start, stop)
+
+		def update(ax):
+			left, right = ax.get_xlim()
+			for channel, line in lines:
+				line.set_data(*self.polyline(channel, left, right, pixels))
+		ax.callbacks.connect('xlim_changed', update)